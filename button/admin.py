@@ -1,17 +1,37 @@
 from django.contrib import admin
 from .models import PageSession, ButtonClick
+from .routers import analytics_alias
+
+
+class AnalyticsChangeListMixin:
+    """Serve changelist (reporting) pages from the analytics database
+
+    Only for GET/HEAD: a POST to the changelist runs actions such as
+    "Delete selected" and list_editable saves, which must use the writable
+    database.
+    """
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if (request.method in ('GET', 'HEAD') and match and match.url_name
+                and match.url_name.endswith('_changelist')):
+            queryset = queryset.using(analytics_alias())
+        return queryset
 
 
 @admin.register(PageSession)
-class PageSessionAdmin(admin.ModelAdmin):
-    list_display = ('session_id', 'loaded_at', 'country_name', 'ip_address', 'clicked', 'time_to_click')
-    list_filter = ('clicked', 'loaded_at', 'country_name')
-    search_fields = ('session_id', 'ip_address', 'country_name')
+class PageSessionAdmin(AnalyticsChangeListMixin, admin.ModelAdmin):
+    list_display = ('session_id', 'loaded_at', 'country', 'ip_address', 'clicked', 'time_to_click')
+    list_filter = ('clicked', 'loaded_at', 'country')
+    list_select_related = ('country',)
+    search_fields = ('session_id', 'ip_address', 'country__name')
     readonly_fields = ('session_id', 'loaded_at')
+    raw_id_fields = ('user_agent', 'browser')
 
 
 @admin.register(ButtonClick)
-class ButtonClickAdmin(admin.ModelAdmin):
+class ButtonClickAdmin(AnalyticsChangeListMixin, admin.ModelAdmin):
     list_display = ('session', 'clicked_at', 'time_elapsed')
     list_filter = ('clicked_at',)
     readonly_fields = ('session', 'clicked_at', 'time_elapsed')
@@ -0,0 +1,167 @@
+"""Logging pieces used by the production LOGGING config
+
+Records are handed to a background thread through a bounded queue, so a
+request never waits on file I/O or message formatting. Filters run on the
+request thread before anything is queued and keep chatty events cheap:
+SamplingFilter keeps a fraction of an event, RateLimitFilter caps an event
+per interval and reports how many were dropped.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed through extra=
+RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records for each sampled event
+
+    ``rates`` maps an ``event`` (passed via extra=) to the fraction to keep.
+    Kept records carry ``sample_rate`` so counts can be scaled back up.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most ``limits[event]`` records through per ``interval`` seconds
+
+    The first record let through after some were dropped carries a
+    ``suppressed`` count.
+    """
+
+    def __init__(self, limits=None, interval=60):
+        super().__init__()
+        self.limits = dict(limits or {})
+        self.interval = interval
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        limit = self.limits.get(event)
+        if limit is None:
+            return True
+
+        now = time.monotonic()
+        with self.lock:
+            started, count, suppressed = self.windows.get(event, (now, 0, 0))
+            if now - started >= self.interval:
+                started, count = now, 0
+            if count < limit:
+                self.windows[event] = (started, count + 1, 0)
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            self.windows[event] = (started, count, suppressed + 1)
+            return False
+
+
+class _Listener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        # Wait for the thread to make room; put_nowait would raise on a full queue
+        self.queue.put(self._sentinel)
+
+
+# Handlers whose listener thread must be restarted in a forked child
+_open_handlers = weakref.WeakSet()
+
+
+def _restart_listeners():
+    for handler in list(_open_handlers):
+        handler._start()
+
+
+os.register_at_fork(after_in_child=_restart_listeners)
+
+
+class BackgroundFileHandler(logging.Handler):
+    """Queue records for a background thread that formats and writes them to a file
+
+    The queue is bounded; when it is full records are dropped and counted
+    rather than blocking the request. Threads don't survive fork(), so a
+    preloaded gunicorn worker starts its own listener after forking.
+
+    This is a plain Handler rather than a QueueHandler subclass: on Python
+    3.12+ dictConfig treats QueueHandler subclasses specially and requires
+    them to name their target handlers.
+    """
+
+    def __init__(self, filename, mode='a', encoding='utf-8', max_queue=10000):
+        super().__init__()
+        self.max_queue = max_queue
+        self.target = logging.FileHandler(filename, mode, encoding, delay=True)
+        self.queue = None
+        self.listener = None
+        self.dropped = 0
+        self._start()
+        _open_handlers.add(self)
+
+    def _start(self):
+        self.queue = queue.Queue(self.max_queue)
+        self.listener = _Listener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def setLevel(self, level):
+        super().setLevel(level)
+        self.target.setLevel(level)
+
+    def emit(self, record):
+        # Formatting happens on the listener thread; just snapshot the record
+        try:
+            self.queue.put_nowait(copy.copy(record))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # logging.shutdown() closes every handler at exit, flushing the queue
+        _open_handlers.discard(self)
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
@@ -0,0 +1,44 @@
+"""Helpers shared by the benchmark management commands"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database():
+    """Run against a throwaway, migrated SQLite file so benchmarks never touch the real database"""
+    workdir = tempfile.mkdtemp(prefix='justabutton_bench_')
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield workdir
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+@contextmanager
+def simulated_geoip(delay_ms):
+    """Replace the GeoIP lookup with a fixed delay so no network calls are made"""
+    delay = delay_ms / 1000
+
+    def fake_country(ip):
+        time.sleep(delay)
+        return {'country_code': 'US', 'country_name': 'United States'}
+
+    with mock.patch('button.views.get_country_from_ip', fake_country):
+        yield
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    return sorted_values[max(0, int(len(sorted_values) * fraction + 0.5) - 1)]
@@ -0,0 +1,100 @@
+import copy
+import json
+import logging
+import logging.config
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from button.management.benchmarks import percentile, scratch_database, simulated_geoip
+
+
+def sync_config(filename):
+    """The previous production setup: plain FileHandler written on the request thread"""
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'file': {'level': 'INFO', 'class': 'logging.FileHandler', 'filename': filename},
+        },
+        'loggers': {
+            'button': {'handlers': ['file'], 'level': 'INFO', 'propagate': False},
+        },
+    }
+
+
+def queue_config(filename):
+    """The production LOGGING from settings_prod, pointed at a scratch file"""
+    from config import settings_prod
+
+    config = copy.deepcopy(settings_prod.LOGGING)
+    config['handlers']['file']['filename'] = filename
+    config['loggers'].pop('django', None)
+    return config
+
+
+class Command(BaseCommand):
+    help = 'Measure /api/session/ latency with logging off, synchronous file logging and the queued JSON pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Sessions to create per mode')
+        parser.add_argument('--blocked-every', type=int, default=5,
+                            help='Send a blocked referrer on every Nth request (0 to disable)')
+
+    def handle(self, *args, **options):
+        rows = []
+        with scratch_database() as workdir, simulated_geoip(0), override_settings(ALLOWED_HOSTS=['*'], RATE_LIMITS={}):
+            log_path = os.path.join(workdir, 'bench.log')
+            for name, config in (('off', None), ('sync', sync_config(log_path)), ('queue', queue_config(log_path))):
+                rows.append((name, self.run(options, config, log_path)))
+
+        self.stdout.write(f"{'logging':<8}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'log lines':>11}")
+        for name, r in rows:
+            self.stdout.write(
+                f"{name:<8}{r['mean']:>9.3f}{r['p50']:>9.3f}{r['p95']:>9.3f}{r['p99']:>9.3f}{r['lines']:>11}"
+            )
+
+    def run(self, options, config, log_path):
+        button_logger = logging.getLogger('button')
+        saved = (button_logger.handlers[:], button_logger.level, button_logger.propagate)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+
+        if config is None:
+            logging.disable(logging.CRITICAL)
+        else:
+            logging.config.dictConfig(config)
+
+        client = Client(REMOTE_ADDR='198.51.100.7')
+        latencies = []
+        try:
+            for i in range(options['requests']):
+                blocked = options['blocked_every'] and i % options['blocked_every'] == 0
+                body = json.dumps({'referrer': 'javascript:alert(1)' if blocked else 'https://example.com/'})
+                started = time.perf_counter()
+                client.post('/api/session/', data=body, content_type='application/json')
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            logging.disable(logging.NOTSET)
+            for handler in button_logger.handlers:
+                if handler not in saved[0]:
+                    handler.close()
+            button_logger.handlers, button_logger.level, button_logger.propagate = saved
+
+        lines = 0
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                lines = sum(1 for _ in f)
+
+        latencies.sort()
+        return {
+            'mean': statistics.fmean(latencies),
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'lines': lines,
+        }
@@ -0,0 +1,107 @@
+import json
+import multiprocessing
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from button import ratelimit
+from button.management.benchmarks import percentile, scratch_database, simulated_geoip
+
+
+def _flood(stop, counts, rate):
+    """One flooding process: post sessions from a single IP at a fixed rate until told to stop"""
+    # The benchmark flood may hit 'database is locked'; count it like any other response
+    client = Client(REMOTE_ADDR='203.0.113.66', raise_request_exception=False)
+    count = 0
+    next_at = time.monotonic()
+    while not stop.is_set():
+        client.post('/api/session/', data='{}', content_type='application/json')
+        count += 1
+        # Open loop: the attacker's pace doesn't depend on how fast we answer
+        next_at += 1 / rate
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    connections.close_all()
+    counts.put(count)
+
+
+class Command(BaseCommand):
+    help = 'Measure real-user /api/session/ latency while one IP floods it, with and without rate limiting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+        parser.add_argument('--flooders', type=int, default=8,
+                            help='Flooding processes, each standing in for a server worker busy with the flood')
+        parser.add_argument('--geoip-ms', type=float, default=5.0,
+                            help='Simulated GeoIP lookup cost per session (no network calls are made)')
+        parser.add_argument('--flood-rate', type=float, default=50.0,
+                            help='Requests per second sent by each flooding process')
+
+    def handle(self, *args, **options):
+        with scratch_database(), simulated_geoip(options['geoip_ms']):
+            rows = [
+                ('baseline', self.run(options, flood=False, limited=True)),
+                ('flood, unlimited', self.run(options, flood=True, limited=False)),
+                ('flood, limited', self.run(options, flood=True, limited=True)),
+            ]
+
+        self.stdout.write(f"{'run':<18}{'user reqs':>10}{'p50 ms':>9}{'p95 ms':>9}{'flood reqs':>12}{'shed':>8}")
+        for name, r in rows:
+            self.stdout.write(
+                f"{name:<18}{r['requests']:>10}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['flood']:>12}{r['shed']:>8}"
+            )
+        self.stdout.write('')
+        self.stdout.write(f"{multiprocessing.cpu_count()} CPU(s); with fewer than --flooders + 1 the flooders also "
+                          "compete with real users for CPU, as they would on an undersized server.")
+
+    def run(self, options, flood, limited):
+        ratelimit._limiters.clear()
+        limits = ratelimit.settings.RATE_LIMITS if limited else {}
+        latencies = []
+
+        with override_settings(RATE_LIMITS=limits, ALLOWED_HOSTS=['*']):
+            # Create the limiters and drop connections before forking, as the
+            # preloaded gunicorn master does, so the flooders share the buckets
+            ratelimit.create_limiters()
+            connections.close_all()
+
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            counts = context.Queue()
+            processes = [context.Process(target=_flood, args=(stop, counts, options['flood_rate']))
+                         for _ in range(options['flooders'] if flood else 0)]
+            for process in processes:
+                process.start()
+
+            # Real users: one request each from distinct addresses, paced like page loads
+            deadline = time.monotonic() + options['duration']
+            user = 0
+            while time.monotonic() < deadline:
+                user += 1
+                client = Client(REMOTE_ADDR=f'198.51.100.{user % 250 + 1}')
+                started = time.perf_counter()
+                response = client.post('/api/session/', data=json.dumps({'browser_name': 'Chrome'}),
+                                       content_type='application/json')
+                if response.status_code == 200:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                time.sleep(0.02)
+
+            stop.set()
+            flood_requests = sum(counts.get() for _ in processes)
+            for process in processes:
+                process.join()
+            shed = ratelimit.limiter_stats().get('session', {}).get('shed', 0)
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p95': percentile(latencies, 0.95),
+            'flood': flood_requests,
+            'shed': shed,
+        }
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from button.models import uuid7
+
+
+# Mirrors the columns Django creates for PageSession/ButtonClick on SQLite
+# (UUIDField is stored as char(32) hex).
+SCHEMA = """
+CREATE TABLE session ("session_id" char(32) NOT NULL PRIMARY KEY, "loaded_at" datetime NOT NULL, "user_agent" text NOT NULL);
+CREATE TABLE click ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "session_id" char(32) NOT NULL, "time_elapsed" real NOT NULL);
+CREATE INDEX click_session_id ON click ("session_id");
+"""
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PageSession-style inserts with uuid4 vs uuid7 primary keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000, help='Rows to insert per run')
+        parser.add_argument('--batch', type=int, default=10_000, help='Rows per transaction')
+        parser.add_argument('--cache-mb', type=int, default=16, help='SQLite page cache size in MB')
+        parser.add_argument('--dir', default=None, help='Directory for the scratch databases')
+
+    def handle(self, *args, **options):
+        workdir = options['dir'] or tempfile.mkdtemp(prefix='bench_session_ids_')
+        cleanup = options['dir'] is None
+        self.stdout.write(f"Inserting {options['rows']:,} rows per run into {workdir}")
+
+        results = []
+        for name, generator in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            path = os.path.join(workdir, f'{name}.sqlite3')
+            if os.path.exists(path):
+                os.remove(path)
+            results.append((name, self.run(path, generator, options)))
+            os.remove(path)
+        if cleanup:
+            os.rmdir(workdir)
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'key':<8}{'seconds':>10}{'rows/s':>12}{'file MB':>10}{'pages/batch':>13}{'ms/batch':>10}"
+        )
+        for name, r in results:
+            self.stdout.write(
+                f"{name:<8}{r['seconds']:>10.1f}{r['rows_per_sec']:>12,.0f}{r['file_mb']:>10.1f}"
+                f"{r['pages_per_batch']:>13,.0f}{r['ms_per_batch']:>10.1f}"
+            )
+        self.stdout.write('')
+        self.stdout.write('pages/batch = pages each commit wrote to the WAL, averaged over the last 10% of batches.')
+        self.stdout.write('Random keys land on a different index leaf for nearly every row, so a batch rewrites')
+        self.stdout.write('(and, once the index outgrows the cache, first reads back) about a page per row;')
+        self.stdout.write('time-ordered keys append to the right-most leaves and touch only a few.')
+
+    def run(self, path, generator, options):
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute(f"PRAGMA cache_size = -{options['cache_mb'] * 1024}")
+        # Checkpoint by hand after every commit so the WAL holds exactly the pages that commit wrote
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA wal_autocheckpoint = 0')
+        conn.executescript(SCHEMA)
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        wal_path = f'{path}-wal'
+
+        rows = options['rows']
+        batch = options['batch']
+        batches = []
+        started = time.perf_counter()
+        inserted = 0
+        while inserted < rows:
+            count = min(batch, rows - inserted)
+            ids = [generator().hex for _ in range(count)]
+            now = time.strftime('%Y-%m-%d %H:%M:%S')
+            batch_started = time.perf_counter()
+            conn.execute('BEGIN')
+            conn.executemany(
+                'INSERT INTO session (session_id, loaded_at, user_agent) VALUES (?, ?, ?)',
+                ((session_id, now, USER_AGENT) for session_id in ids),
+            )
+            conn.executemany(
+                'INSERT INTO click (session_id, time_elapsed) VALUES (?, ?)',
+                ((session_id, 1.0) for session_id in ids[::2]),
+            )
+            conn.execute('COMMIT')
+            # 32-byte WAL header, then one 24-byte frame header plus a page per page written
+            pages = (os.path.getsize(wal_path) - 32) // (page_size + 24)
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            batches.append((pages, time.perf_counter() - batch_started))
+            inserted += count
+        seconds = time.perf_counter() - started
+        conn.close()
+
+        late = batches[-max(1, len(batches) // 10):]
+        return {
+            'seconds': seconds,
+            'rows_per_sec': rows / seconds if seconds else 0,
+            'file_mb': os.path.getsize(path) / (1024 * 1024),
+            'pages_per_batch': sum(pages for pages, _ in late) / len(late),
+            'ms_per_batch': sum(elapsed for _, elapsed in late) / len(late) * 1000,
+        }
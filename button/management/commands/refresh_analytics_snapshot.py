@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from button.routers import ANALYTICS_DB_ALIAS, is_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Copy the default SQLite database into the read-only analytics snapshot using the online backup API. '
+            'Run with --loop under the process manager to refresh it every ANALYTICS_SNAPSHOT_INTERVAL seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing until stopped')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between refreshes (default: settings.ANALYTICS_SNAPSHOT_INTERVAL)')
+        parser.add_argument('--pages', type=int, default=-1,
+                            help='Pages copied per backup step; -1 copies everything under one short read lock')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between backup steps')
+
+    def handle(self, *args, **options):
+        if ANALYTICS_DB_ALIAS not in settings.DATABASES:
+            raise CommandError(f"No '{ANALYTICS_DB_ALIAS}' database configured; see settings_prod.py")
+        if not is_snapshot():
+            self.stdout.write(f"'{ANALYTICS_DB_ALIAS}' is a replica; it is kept fresh by the database server.")
+            return
+        if settings.DATABASES[DEFAULT_DB_ALIAS]['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Snapshots can only be taken of a SQLite default database')
+
+        interval = options['interval'] or settings.ANALYTICS_SNAPSHOT_INTERVAL
+        while True:
+            started = time.perf_counter()
+            self.refresh(options['pages'], options['sleep'])
+            elapsed = time.perf_counter() - started
+            size_mb = os.path.getsize(settings.ANALYTICS_SNAPSHOT_PATH) / (1024 * 1024)
+            self.stdout.write(f"Snapshot refreshed in {elapsed * 1000:.0f} ms ({size_mb:.1f} MB)")
+            if not options['loop']:
+                break
+            time.sleep(max(0.0, interval - elapsed))
+
+    def refresh(self, pages, sleep):
+        """Back up into a temporary file and swap it in, so readers never see a partial copy"""
+        source_path = settings.DATABASES[DEFAULT_DB_ALIAS]['NAME']
+        target_path = str(settings.ANALYTICS_SNAPSHOT_PATH)
+        tmp_path = f'{target_path}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target, pages=pages, sleep=sleep)
+        finally:
+            target.close()
+            source.close()
+        # Connections already open on the old file keep reading it until they close
+        os.replace(tmp_path, target_path)
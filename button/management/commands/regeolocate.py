@@ -0,0 +1,161 @@
+import ipaddress
+import json
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from button.models import Country, PageSession
+from button.views import get_ip2location_path, open_ip2location
+
+
+# Set in each worker process by _init_worker
+_database = None
+
+
+def _init_worker(db_path):
+    """Open the BIN once per worker; memory-mapped, so the pages are shared between workers"""
+    global _database
+    _database = open_ip2location(db_path)
+
+
+def _resolve(ips):
+    """Look up a sorted run of IPs, returning (ip, country_code, country_name) for each"""
+    results = []
+    for ip in ips:
+        code = name = ''
+        try:
+            rec = _database.get_all(ip)
+            if rec and rec.country_short and rec.country_short != '-':
+                code, name = rec.country_short, rec.country_long
+        except Exception:
+            pass
+        results.append((ip, code, name))
+    return results
+
+
+def _ip_sort_key(ip):
+    """Numeric order keeps neighbouring lookups in neighbouring BIN pages"""
+    try:
+        address = ipaddress.ip_address(ip)
+        return (address.version, int(address))
+    except ValueError:
+        return (0, 0)
+
+
+class Command(BaseCommand):
+    help = ('Re-resolve the country of existing sessions against the local IP2Location database, '
+            'e.g. after get_ip2location.sh installs a newer BIN')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Re-check every session, not just those without a country')
+        parser.add_argument('--database', help='BIN file to use (default: the *.BIN in the project root)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Lookup processes')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Sessions read per chunk')
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions written per transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to wait after each write batch so the live site gets the write lock')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, 'cache', 'regeolocate.json'),
+                            help='File recording progress so an interrupted run can resume')
+        parser.add_argument('--restart', action='store_true', help='Ignore any saved checkpoint')
+
+    def handle(self, *args, **options):
+        db_path = options['database'] or get_ip2location_path()
+        if not db_path or not os.path.exists(db_path):
+            raise CommandError('No IP2Location BIN file found; run get_ip2location.sh or pass --database')
+
+        mode = 'all' if options['all'] else 'missing'
+        last_id = self.load_checkpoint(options['checkpoint'], mode, options['restart'])
+        if last_id:
+            self.stdout.write(f"Resuming after session {last_id}")
+
+        sessions = PageSession.objects.filter(ip_address__isnull=False).order_by('session_id')
+        if mode == 'missing':
+            sessions = sessions.filter(country__isnull=True)
+
+        # The workers never touch the database; don't hand them our connection
+        connections.close_all()
+
+        scanned = updated = resolved = 0
+        started = time.perf_counter()
+        # Fork explicitly: spawn/forkserver workers would re-import this module
+        # without django.setup() and fail with AppRegistryNotReady
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['workers'], initializer=_init_worker, initargs=(db_path,)) as pool:
+            while True:
+                chunk = sessions
+                if last_id:
+                    chunk = chunk.filter(session_id__gt=last_id)
+                rows = list(chunk.values_list('session_id', 'ip_address', 'country_id')[:options['chunk_size']])
+                if not rows:
+                    break
+
+                countries = self.resolve(pool, {ip for _, ip, _ in rows}, options['workers'])
+                resolved += len(countries)
+
+                changes = []
+                for session_id, ip, country_id in rows:
+                    new_country_id = countries.get(ip)
+                    if new_country_id and new_country_id != country_id:
+                        changes.append(PageSession(session_id=session_id, country_id=new_country_id))
+                updated += self.write(changes, options['batch_size'], options['pause'])
+
+                scanned += len(rows)
+                last_id = rows[-1][0]
+                self.save_checkpoint(options['checkpoint'], mode, last_id)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{scanned:,} scanned, {updated:,} updated, {resolved:,} IPs resolved "
+                    f"({scanned / elapsed:,.0f} sessions/s)"
+                )
+
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {scanned:,} sessions scanned, {updated:,} updated in {elapsed:.1f}s"
+        ))
+
+    def resolve(self, pool, ips, workers):
+        """Resolve unique IPs in parallel, returning {ip: country id} for the ones found"""
+        ips = sorted(ips, key=_ip_sort_key)
+        # Contiguous slices so each worker walks its own region of the BIN
+        size = max(1, -(-len(ips) // workers))
+        slices = [ips[i:i + size] for i in range(0, len(ips), size)]
+
+        countries = {}
+        for results in pool.map(_resolve, slices):
+            for ip, code, name in results:
+                if code:
+                    countries[ip] = Country.intern(code, name)
+        return countries
+
+    def write(self, changes, batch_size, pause):
+        """bulk_update in short transactions, pausing between them"""
+        for i in range(0, len(changes), batch_size):
+            with transaction.atomic():
+                PageSession.objects.bulk_update(changes[i:i + batch_size], ['country'])
+            if pause:
+                time.sleep(pause)
+        return len(changes)
+
+    def load_checkpoint(self, path, mode, restart):
+        if restart or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('mode') != mode:
+            raise CommandError(f"Checkpoint {path} is from a --{checkpoint.get('mode')} run; use --restart")
+        return checkpoint['last_session_id']
+
+    def save_checkpoint(self, path, mode, last_id):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'mode': mode, 'last_session_id': str(last_id)}, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,83 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs in a fresh interpreter, standing in for one newly started worker
+PROBE = r'''
+import io, json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+imported = time.perf_counter()
+
+warm_up_ms = 0.0
+if sys.argv[1] == 'warm':
+    from button.warmup import warm_up
+    warm_up_ms = warm_up() * 1000
+ready = time.perf_counter()
+
+from django.conf import settings
+host = (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.').replace('*', 'localhost')
+responses = {}
+for path in sys.argv[2:]:
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': host,
+        'SERVER_PORT': '443', 'HTTP_HOST': host, 'REMOTE_ADDR': '127.0.0.1', 'wsgi.url_scheme': 'https',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    }
+    status = []
+    t = time.perf_counter()
+    body = application(environ, lambda s, h, exc_info=None: status.append(s))
+    b''.join(body)
+    responses[path] = {'status': status[0].split()[0], 'ms': (time.perf_counter() - t) * 1000}
+
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'warm_up_ms': warm_up_ms,
+    'first_response_ms': (time.perf_counter() - ready) * 1000,
+    'responses': responses,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and time-to-first-response of freshly started worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3, help='Fresh processes to start per mode')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='URL to request once the app is loaded (repeatable; default / and /api/stats/)')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/api/stats/']
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+
+        for mode in ('cold', 'warm'):
+            self.stdout.write(f"{mode}: {'import ms':>10}{'warm-up ms':>12}{'first resp ms':>15}   per path")
+            runs = []
+            for worker in range(options['workers']):
+                output = subprocess.run(
+                    [sys.executable, '-c', PROBE, mode, *paths],
+                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+                ).stdout
+                run = json.loads(output.strip().splitlines()[-1])
+                runs.append(run)
+                per_path = ', '.join(f"{p} {r['status']} {r['ms']:.1f}" for p, r in run['responses'].items())
+                self.stdout.write(
+                    f"  #{worker + 1:<3}{run['import_ms']:>10.1f}{run['warm_up_ms']:>12.1f}"
+                    f"{run['first_response_ms']:>15.1f}   {per_path}"
+                )
+            self.stdout.write(
+                f"  med {statistics.median(r['import_ms'] for r in runs):>10.1f}"
+                f"{statistics.median(r['warm_up_ms'] for r in runs):>12.1f}"
+                f"{statistics.median(r['first_response_ms'] for r in runs):>15.1f}"
+            )
+            self.stdout.write('')
+        self.stdout.write('With preload_app the warm-up runs once in the gunicorn master, so forked '
+                          'workers start at the "warm" first-response time.')
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:16
+
+import button.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('button', '0004_pagesession_browser_name_pagesession_browser_version'),
+    ]
+
+    # Only the Python-side default changes, so skip the SQLite table rebuild.
+    # Existing uuid4 session IDs are left untouched and remain valid.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='pagesession',
+                    name='session_id',
+                    field=models.UUIDField(default=button.models.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('button', '0005_pagesession_session_id_uuid7'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Country',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='ISO 3166-1 alpha-2 country code', max_length=2, unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'verbose_name_plural': 'countries',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(editable=False, max_length=32, unique=True)),
+                ('value', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Browser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Browser name (Chrome, Firefox, Safari, etc.)', max_length=50)),
+                ('version', models.CharField(blank=True, help_text='Browser version', max_length=50)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'version'), name='unique_browser_name_version')],
+            },
+        ),
+        # Keep the old text column around until 0007 has copied it over.
+        migrations.RenameField(
+            model_name='pagesession',
+            old_name='user_agent',
+            new_name='user_agent_text',
+        ),
+        migrations.AddField(
+            model_name='pagesession',
+            name='user_agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='button.useragent'),
+        ),
+        migrations.AddField(
+            model_name='pagesession',
+            name='browser',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='button.browser'),
+        ),
+        migrations.AddField(
+            model_name='pagesession',
+            name='country',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='button.country'),
+        ),
+    ]
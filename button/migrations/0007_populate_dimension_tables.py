@@ -0,0 +1,118 @@
+import hashlib
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+BATCH_SIZE = 1000
+
+
+def user_agent_hash(value):
+    """Copy of button.models.user_agent_hash as it was when this migration was written"""
+    return hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+@contextmanager
+def temporary_index(schema_editor, table, *columns):
+    """Index the lookup columns for the duration of the backfill only"""
+    quote = schema_editor.quote_name
+    name = quote(f'{table}_{"_".join(columns)}_backfill')
+    # Postgres btree keys are capped at ~2.7kB and user agents aren't; a hash index has no limit
+    method = 'USING hash ' if schema_editor.connection.vendor == 'postgresql' and len(columns) == 1 else ''
+    schema_editor.execute(f'CREATE INDEX {name} ON {quote(table)} {method}({", ".join(map(quote, columns))})')
+    try:
+        yield
+    finally:
+        schema_editor.execute(f'DROP INDEX {name}')
+
+
+def populate_dimensions(apps, schema_editor):
+    """Dedupe existing session strings into the dimension tables and link them"""
+    PageSession = apps.get_model('button', 'PageSession')
+    UserAgent = apps.get_model('button', 'UserAgent')
+    Country = apps.get_model('button', 'Country')
+    Browser = apps.get_model('button', 'Browser')
+    # No default ordering, or it would be pulled into the DISTINCT queries below
+    sessions = PageSession.objects.order_by()
+
+    # User agents
+    values = sessions.exclude(user_agent_text='').values_list('user_agent_text', flat=True).distinct().iterator()
+    # Insert a slice at a time so the distinct strings are never all in memory
+    while batch := list(islice(values, BATCH_SIZE)):
+        UserAgent.objects.bulk_create(
+            [UserAgent(hash=user_agent_hash(value), value=value) for value in batch],
+            ignore_conflicts=True,
+        )
+    with temporary_index(schema_editor, UserAgent._meta.db_table, 'value'):
+        sessions.exclude(user_agent_text='').update(user_agent=Subquery(
+            UserAgent.objects.filter(value=OuterRef('user_agent_text')).values('pk')[:1]
+        ))
+
+    # Countries - one row per code, first non-empty name wins
+    names = {}
+    pairs = sessions.exclude(country_code='').values_list('country_code', 'country_name').distinct()
+    for code, name in pairs.iterator():
+        if not names.get(code):
+            names[code] = name
+    Country.objects.bulk_create(
+        [Country(code=code, name=name) for code, name in names.items()],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    # Country.code is unique, so each correlated lookup is already an index seek
+    sessions.exclude(country_code='').update(country=Subquery(
+        Country.objects.filter(code=OuterRef('country_code')).values('pk')[:1]
+    ))
+
+    # Browsers - normalised the same way Browser.intern does
+    browsers = {}
+    pairs = sessions.exclude(browser_name='').values_list('browser_name', 'browser_version').distinct()
+    for raw_name, raw_version in pairs.iterator():
+        key = (raw_name.strip()[:50], (raw_version or '').strip()[:50])
+        if key[0]:
+            browsers.setdefault(key, []).append((raw_name, raw_version))
+    Browser.objects.bulk_create(
+        [Browser(name=name, version=version) for name, version in browsers],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    # Few distinct pairs, but a scan of the session table for each one without this index
+    with temporary_index(schema_editor, PageSession._meta.db_table, 'browser_name', 'browser_version'):
+        for browser in Browser.objects.all():
+            for raw_name, raw_version in browsers.get((browser.name, browser.version), []):
+                sessions.filter(browser_name=raw_name, browser_version=raw_version).update(browser=browser.pk)
+
+
+def restore_columns(apps, schema_editor):
+    """Copy dimension values back onto the session rows"""
+    PageSession = apps.get_model('button', 'PageSession')
+    UserAgent = apps.get_model('button', 'UserAgent')
+    Country = apps.get_model('button', 'Country')
+    Browser = apps.get_model('button', 'Browser')
+
+    def lookup(model, fk, column):
+        return Subquery(model.objects.filter(pk=OuterRef(fk)).values(column)[:1])
+
+    sessions = PageSession.objects.order_by()
+    sessions.filter(user_agent__isnull=False).update(user_agent_text=lookup(UserAgent, 'user_agent', 'value'))
+    sessions.filter(country__isnull=False).update(
+        country_code=lookup(Country, 'country', 'code'),
+        country_name=lookup(Country, 'country', 'name'),
+    )
+    sessions.filter(browser__isnull=False).update(
+        browser_name=lookup(Browser, 'browser', 'name'),
+        browser_version=lookup(Browser, 'browser', 'version'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('button', '0006_dimension_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_dimensions, restore_columns),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('button', '0007_populate_dimension_tables'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pagesession',
+            name='user_agent_text',
+        ),
+        migrations.RemoveField(
+            model_name='pagesession',
+            name='country_code',
+        ),
+        migrations.RemoveField(
+            model_name='pagesession',
+            name='country_name',
+        ),
+        migrations.RemoveField(
+            model_name='pagesession',
+            name='browser_name',
+        ),
+        migrations.RemoveField(
+            model_name='pagesession',
+            name='browser_version',
+        ),
+    ]
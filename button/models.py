@@ -1,22 +1,146 @@
 from django.db import models
 from django.utils import timezone
+from functools import lru_cache
+import hashlib
+import os
+import threading
+import time
 import uuid
 
+# Last (milliseconds << 12 | fraction) handed out by uuid7 in this process
+_uuid7_last = 0
+_uuid7_lock = threading.Lock()
+
+
+def uuid7():
+    """Generate a time-ordered UUIDv7 (RFC 9562).
+
+    The first 48 bits are the Unix timestamp in milliseconds and the next 12
+    bits carry the sub-millisecond fraction, so new session IDs sort after
+    older ones and inserts land at the end of the primary key index instead
+    of at a random spot. The string form is a normal UUID, so existing
+    uuid4 session IDs stay valid alongside the new ones.
+
+    Within a process IDs strictly increase: two calls in the same 1/4096 ms,
+    or after the clock steps back, get the previous timestamp plus one tick.
+    """
+    global _uuid7_last
+    nanoseconds = time.time_ns()
+    timestamp = (nanoseconds // 1_000_000) << 12 | (nanoseconds % 1_000_000) * 4096 // 1_000_000
+    with _uuid7_lock:
+        if timestamp <= _uuid7_last:
+            timestamp = _uuid7_last + 1
+        _uuid7_last = timestamp
+    milliseconds, fraction = timestamp >> 12, timestamp & 0xFFF
+    rand_b = int.from_bytes(os.urandom(8), 'big') & 0x3FFFFFFFFFFFFFFF
+
+    value = (milliseconds & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76  # version
+    value |= fraction << 64
+    value |= 0x2 << 62  # RFC 4122 variant
+    value |= rand_b
+    return uuid.UUID(int=value)
+
+
+def user_agent_hash(value):
+    """Stable digest used to intern user agent strings"""
+    return hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+class UserAgent(models.Model):
+    """Distinct User-Agent header, shared by every session that sent it"""
+    hash = models.CharField(max_length=32, unique=True, editable=False)
+    value = models.TextField()
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def intern(cls, value):
+        """Return the id of the row for this user agent, creating it if needed"""
+        if not value:
+            return None
+        return _intern_user_agent(value)
+
+
+class Country(models.Model):
+    """ISO 3166-1 country, keyed by its alpha-2 code"""
+    code = models.CharField(max_length=2, unique=True, help_text="ISO 3166-1 alpha-2 country code")
+    name = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'countries'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name or self.code
+
+    @classmethod
+    def intern(cls, code, name=''):
+        """Return the id of the row for this country code, creating it if needed"""
+        if not code:
+            return None
+        return _intern_country(code, name)
+
+
+class Browser(models.Model):
+    """Browser name/version pair reported by the client"""
+    name = models.CharField(max_length=50, help_text="Browser name (Chrome, Firefox, Safari, etc.)")
+    version = models.CharField(max_length=50, blank=True, help_text="Browser version")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'version'], name='unique_browser_name_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} {self.version}".strip()
+
+    @classmethod
+    def intern(cls, name, version=''):
+        """Return the id of the row for this browser, creating it if needed"""
+        name = (name or '').strip()[:50]
+        if not name:
+            return None
+        return _intern_browser(name, (version or '').strip()[:50])
+
+
+# In-process caches for the create_session hot path. Dimension rows are never
+# deleted, so a cached id stays valid for the life of the worker.
+@lru_cache(maxsize=4096)
+def _intern_user_agent(value):
+    obj, _ = UserAgent.objects.get_or_create(hash=user_agent_hash(value), defaults={'value': value})
+    return obj.pk
+
+
+@lru_cache(maxsize=512)
+def _intern_country(code, name):
+    obj, _ = Country.objects.get_or_create(code=code, defaults={'name': name})
+    if name and not obj.name:
+        # The row was created by a lookup that had no name. The name is part of
+        # the cache key, so the first call that brings one always reaches here.
+        Country.objects.filter(pk=obj.pk, name='').update(name=name)
+    return obj.pk
+
+
+@lru_cache(maxsize=1024)
+def _intern_browser(name, version):
+    obj, _ = Browser.objects.get_or_create(name=name, version=version)
+    return obj.pk
+
 
 class PageSession(models.Model):
     """Track each page visit/session"""
-    session_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     loaded_at = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
+    user_agent = models.ForeignKey(UserAgent, null=True, blank=True, on_delete=models.PROTECT, related_name='sessions')
     clicked = models.BooleanField(default=False)
     time_to_click = models.FloatField(null=True, blank=True, help_text="Seconds from page load to click")
-    country_code = models.CharField(max_length=2, blank=True, help_text="ISO 3166-1 alpha-2 country code")
-    country_name = models.CharField(max_length=100, blank=True)
+    country = models.ForeignKey(Country, null=True, blank=True, on_delete=models.PROTECT, related_name='sessions')
     referrer = models.TextField(blank=True, help_text="HTTP Referer header - where visitor came from")
     reclick_attempts = models.IntegerField(default=0, help_text="Number of times user tried to click after already clicking")
-    browser_name = models.CharField(max_length=50, blank=True, help_text="Browser name (Chrome, Firefox, Safari, etc.)")
-    browser_version = models.CharField(max_length=50, blank=True, help_text="Browser version")
+    browser = models.ForeignKey(Browser, null=True, blank=True, on_delete=models.PROTECT, related_name='sessions')
 
     class Meta:
         ordering = ['-loaded_at']
@@ -0,0 +1,124 @@
+"""Open Graph social sharing image for JustAButton
+
+The background, button and title never change, so they are rendered once per
+process with NumPy array maths (instead of hundreds of PIL draw calls) and
+only the live counters are drawn on top of a copy for each render.
+"""
+
+from functools import lru_cache
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Image dimensions (recommended for OG and Twitter)
+WIDTH = 1200
+HEIGHT = 630
+
+# Purple gradient (matching website: #667eea to #764ba2)
+GRADIENT_TOP = (102, 126, 234)
+GRADIENT_BOTTOM = (118, 75, 162)
+
+# Button gradient from #ff6b6b (edge) to #ee5a6f (centre)
+BUTTON_EDGE = (255, 107, 107)
+BUTTON_CENTER = (238, 90, 111)
+
+BUTTON_SIZE = 300
+BUTTON_X = (WIDTH - BUTTON_SIZE) // 2
+BUTTON_Y = (HEIGHT - BUTTON_SIZE) // 2 - 40
+SHADOW_OFFSET = 15
+
+FONT_PATHS = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+    ("/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+     "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf"),
+]
+
+
+@lru_cache(maxsize=None)
+def get_font(size, bold=True):
+    """Load a system font, falling back to PIL's default"""
+    for bold_path, regular_path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(bold_path if bold else regular_path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _lerp(start, end, ratio):
+    """Per-channel linear interpolation, truncated to ints like the original PIL version"""
+    start = np.array(start, dtype=np.float64)
+    end = np.array(end, dtype=np.float64)
+    return (start + (end - start) * ratio[..., None]).astype(np.uint8)
+
+
+def _draw_centered_text(draw, text, font, y, fill, shadow=0):
+    bbox = draw.textbbox((0, 0), text, font=font)
+    x = (WIDTH - (bbox[2] - bbox[0])) // 2
+    if shadow:
+        draw.text((x + shadow, y + shadow), text, font=font, fill=(0, 0, 0))
+    draw.text((x, y), text, font=font, fill=fill)
+    return bbox
+
+
+@lru_cache(maxsize=1)
+def _base_pixels():
+    """Gradient, shadow and button as an RGB array; rendered once per process"""
+    ys, xs = np.mgrid[0:HEIGHT, 0:WIDTH]
+
+    # Vertical background gradient
+    pixels = _lerp(GRADIENT_TOP, GRADIENT_BOTTOM, ys[:, 0] / HEIGHT)[:, None, :].repeat(WIDTH, axis=1)
+
+    radius = BUTTON_SIZE / 2
+    center_x = BUTTON_X + radius
+    center_y = BUTTON_Y + radius
+
+    # Button shadow
+    shadow = np.hypot(xs - center_x - SHADOW_OFFSET, ys - center_y - SHADOW_OFFSET) <= radius
+    pixels[shadow] = 0
+
+    # Radial button fill: each pixel takes the colour of the innermost ring covering it
+    distance = np.hypot(xs - center_x, ys - center_y)
+    inside = distance <= radius
+    rings = np.clip(np.floor(radius - distance[inside]), 0, radius - 1)
+    pixels[inside] = _lerp(BUTTON_EDGE, BUTTON_CENTER, rings / radius)
+
+    pixels.flags.writeable = False
+    return pixels
+
+
+def base_image(tagline="One Button. One Chance. Forever."):
+    """The static design: background, button, title, button label and tagline"""
+    img = Image.fromarray(_base_pixels(), 'RGB')
+    draw = ImageDraw.Draw(img)
+
+    # "JustAButton" title at top
+    _draw_centered_text(draw, "JustAButton", get_font(80), 60, (255, 255, 255), shadow=3)
+
+    # "Click Me!" on button
+    button_font = get_font(48)
+    bbox = draw.textbbox((0, 0), "Click Me!", font=button_font)
+    label_y = BUTTON_Y + (BUTTON_SIZE - (bbox[3] - bbox[1])) // 2 - 10
+    _draw_centered_text(draw, "Click Me!", button_font, label_y, (255, 255, 255))
+
+    # Tagline at bottom
+    if tagline:
+        _draw_centered_text(draw, tagline, get_font(36, bold=False), HEIGHT - 80, (255, 255, 255), shadow=2)
+    return img
+
+
+def render_png(total_clicks, avg_time):
+    """Render the share image with live counters and return the encoded PNG"""
+    img = base_image()
+    draw = ImageDraw.Draw(img)
+
+    counters = f"{total_clicks:,} clicks"
+    if avg_time:
+        counters += f"  ·  avg {avg_time:.2f}s"
+    _draw_centered_text(draw, counters, get_font(40), BUTTON_Y + BUTTON_SIZE + SHADOW_OFFSET + 25,
+                        (255, 255, 255), shadow=2)
+
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,156 @@
+"""Per-IP token buckets for the ingestion endpoints
+
+Buckets live in anonymous shared memory. Under gunicorn with preload_app the
+master creates the limiters during warm-up (create_limiters), every forked
+worker maps the same pages, and a client gets one budget however its
+requests are spread across workers; the allowed/shed counters are totals
+for the whole server. Without preload each worker creates its own limiters
+and the budgets and counters are per worker.
+"""
+
+import hashlib
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+
+# Table header: allowed and shed counters
+COUNTERS = struct.Struct('QQ')
+# One bucket: key hash (0 = empty), tokens, last update. time.monotonic() is
+# system-wide, so timestamps written by one worker are valid in the others.
+SLOT = struct.Struct('Qdd')
+# Slots searched for a key before the least recently seen one is evicted
+PROBES = 8
+# A worker killed while holding the lock must not stall every other worker
+LOCK_TIMEOUT = 0.05
+
+
+def _key_hash(key):
+    """Stable across processes, unlike hash(); never 0, which marks an empty slot"""
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets in a fixed-size table shared with forked children.
+
+    Each key gets ``burst`` tokens that refill at ``rate`` tokens per second.
+    The table has ``max_keys`` slots; a new key takes a free slot near its
+    hash or evicts the least recently seen key there, so memory stays flat no
+    matter how many IPs show up.
+    """
+
+    def __init__(self, burst, rate, max_keys=10000):
+        self.burst = float(burst)
+        self.rate = float(rate)
+        self.max_keys = max_keys
+        self.memory = mmap.mmap(-1, COUNTERS.size + SLOT.size * max_keys)
+        self.lock = multiprocessing.Lock()
+
+    def allow(self, key):
+        """Take a token for key, returning False if the bucket is empty"""
+        key_hash = _key_hash(key)
+        first = key_hash % self.max_keys
+        now = time.monotonic()
+        if not self.lock.acquire(timeout=LOCK_TIMEOUT):
+            # Fail open rather than block ingestion on a wedged lock
+            return True
+        try:
+            victim = oldest = None
+            for probe in range(min(PROBES, self.max_keys)):
+                offset = COUNTERS.size + (first + probe) % self.max_keys * SLOT.size
+                slot_hash, tokens, updated = SLOT.unpack_from(self.memory, offset)
+                if slot_hash == key_hash:
+                    tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                    break
+                if slot_hash == 0:
+                    tokens = self.burst
+                    break
+                if oldest is None or updated < oldest:
+                    victim, oldest = offset, updated
+            else:
+                offset, tokens = victim, self.burst
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            SLOT.pack_into(self.memory, offset, key_hash, tokens, now)
+            allowed_count, shed_count = COUNTERS.unpack_from(self.memory, 0)
+            COUNTERS.pack_into(self.memory, 0, allowed_count + allowed, shed_count + (not allowed))
+        finally:
+            self.lock.release()
+        return allowed
+
+    def retry_after(self):
+        """Seconds until an empty bucket has a token again"""
+        return max(1, int(1 / self.rate + 0.999)) if self.rate else 60
+
+    def stats(self):
+        # The counters are only advisory: read them unlocked rather than hang on a wedged lock
+        locked = self.lock.acquire(timeout=LOCK_TIMEOUT)
+        try:
+            allowed, shed = COUNTERS.unpack_from(self.memory, 0)
+            tracked = sum(1 for slot_hash, _, _ in SLOT.iter_unpack(self.memory[COUNTERS.size:]) if slot_hash)
+        finally:
+            if locked:
+                self.lock.release()
+        return {
+            'allowed': allowed,
+            'shed': shed,
+            'tracked_keys': tracked,
+        }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(scope):
+    """Return the limiter for a scope in settings.RATE_LIMITS, or None if unlimited"""
+    limits = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+    if not limits:
+        return None
+    limits = tuple(map(float, limits))
+    limiter = _limiters.get(scope)
+    if limiter is None or (limiter.burst, limiter.rate) != limits:
+        with _limiters_lock:
+            # Another thread may have created it while we waited for the lock
+            limiter = _limiters.get(scope)
+            if limiter is None or (limiter.burst, limiter.rate) != limits:
+                limiter = TokenBucketLimiter(*limits, max_keys=getattr(settings, 'RATE_LIMIT_MAX_KEYS', 10000))
+                _limiters[scope] = limiter
+    return limiter
+
+
+def create_limiters():
+    """Create every configured limiter now, so processes forked afterwards share them"""
+    for scope in getattr(settings, 'RATE_LIMITS', {}):
+        get_limiter(scope)
+
+
+def limiter_stats():
+    """Allowed/shed counters for every scope, totalled over the processes sharing the limiters"""
+    return {scope: limiter.stats() for scope, limiter in _limiters.items()}
+
+
+def rate_limit(scope, key_func):
+    """Reject requests over the scope's per-key budget before the view runs"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            limiter = get_limiter(scope)
+            if limiter is not None and not limiter.allow(key_func(request)):
+                response = JsonResponse({'status': 'error', 'message': 'Too many requests'}, status=429)
+                response['Retry-After'] = str(limiter.retry_after())
+                # Skip django.request's per-response warning; a flood would
+                # otherwise turn into a flood of log writes. Use limiter_stats().
+                response._has_been_logged = True
+                return response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
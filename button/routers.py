@@ -0,0 +1,95 @@
+"""Read routing for the optional ``analytics`` database
+
+When settings.DATABASES has an ``analytics`` alias (a periodically refreshed
+SQLite snapshot or a Postgres replica), reads made inside ``analytics_reads()``
+go there so heavy aggregates never contend with the click endpoints' writes.
+Everything else, and all writes, stay on ``default``.
+"""
+
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+ANALYTICS_DB_ALIAS = 'analytics'
+
+_analytics_reads = ContextVar('analytics_reads', default=False)
+
+
+def is_snapshot():
+    """Whether the analytics alias is the SQLite snapshot file (rather than a replica)"""
+    config = settings.DATABASES.get(ANALYTICS_DB_ALIAS)
+    return bool(config) and config['ENGINE'] == 'django.db.backends.sqlite3'
+
+
+def analytics_alias():
+    """Alias reporting reads should use: the analytics copy if it's configured and present"""
+    if ANALYTICS_DB_ALIAS not in settings.DATABASES:
+        return DEFAULT_DB_ALIAS
+    if is_snapshot() and not os.path.exists(settings.ANALYTICS_SNAPSHOT_PATH):
+        # No snapshot taken yet
+        return DEFAULT_DB_ALIAS
+    return ANALYTICS_DB_ALIAS
+
+
+def data_as_of(alias):
+    """When the data on an alias was current"""
+    if alias == ANALYTICS_DB_ALIAS:
+        if is_snapshot():
+            mtime = os.path.getmtime(settings.ANALYTICS_SNAPSHOT_PATH)
+            return datetime.fromtimestamp(mtime, tz=dt_timezone.utc)
+        if connections[alias].vendor == 'postgresql':
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT pg_last_xact_replay_timestamp()')
+                replayed = cursor.fetchone()[0]
+            if replayed is not None:
+                return replayed
+    return timezone.now()
+
+
+@contextmanager
+def analytics_reads():
+    """Route reads in this block (and this thread) to the analytics database"""
+    token = _analytics_reads.set(True)
+    try:
+        yield analytics_alias()
+    finally:
+        _analytics_reads.reset(token)
+
+
+def use_analytics_db(view_func):
+    """View decorator: serve all reads from the analytics database"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with analytics_reads():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class AnalyticsRouter:
+    """Send flagged reads to the analytics copy and keep it out of migrations"""
+
+    def db_for_read(self, model, **hints):
+        if _analytics_reads.get():
+            return analytics_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The analytics database is a copy of default, so objects may mix
+        databases = {DEFAULT_DB_ALIAS, ANALYTICS_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ANALYTICS_DB_ALIAS:
+            return False
+        return None
@@ -1,3 +1,656 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import logging.config
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+
+from . import logging_utils, ratelimit, views
+from .management.commands.regeolocate import Command
+from .models import Browser, ButtonClick, Country, PageSession, UserAgent, _intern_country, user_agent_hash, uuid7
+from .ratelimit import TokenBucketLimiter
+from .views import get_client_ip
+
+
+class UUID7Tests(SimpleTestCase):
+
+    def test_version_variant_and_timestamp(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertGreaterEqual(value.int >> 80, before)
+        self.assertLessEqual(value.int >> 80, time.time_ns() // 1_000_000)
+
+    def test_hex_never_decreases(self):
+        # The primary key is stored as char(32) hex, so this is the index order
+        ids = [uuid7().hex for _ in range(10000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_stalled_or_backwards_clock(self):
+        first = uuid7()
+        with mock.patch('button.models.time.time_ns', return_value=time.time_ns() - 10**9):
+            later = [uuid7() for _ in range(100)]
+        self.assertEqual([u.hex for u in [first] + later], sorted(u.hex for u in [first] + later))
+        self.assertTrue(all(u.version == 7 and u.variant == uuid.RFC_4122 for u in later))
+
+
+class CountryInternTests(TestCase):
+
+    def setUp(self):
+        _intern_country.cache_clear()
+        self.addCleanup(_intern_country.cache_clear)
+
+    def test_blank_name_filled_in_later(self):
+        country_id = Country.intern('ZZ')
+        self.assertEqual(Country.objects.get(pk=country_id).name, '')
+        self.assertEqual(Country.intern('ZZ', 'Zedland'), country_id)
+        self.assertEqual(Country.objects.get(pk=country_id).name, 'Zedland')
+
+    def test_existing_name_kept(self):
+        country_id = Country.intern('ZZ', 'Zedland')
+        self.assertEqual(Country.intern('ZZ', 'Other'), country_id)
+        self.assertEqual(Country.intern('ZZ'), country_id)
+        self.assertEqual(Country.objects.get(pk=country_id).name, 'Zedland')
+
+
+class DimensionMigrationTests(TransactionTestCase):
+    """0006-0008 move the session strings into the dimension tables and back"""
+
+    before = [('button', '0005_pagesession_session_id_uuid7')]
+    after = [('button', '0008_remove_pagesession_denormalized_columns')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(self.after)
+
+    def create_old_sessions(self):
+        OldSession = self.migrate(self.before).get_model('button', 'PageSession')
+        rows = [
+            ('Mozilla/5.0 Firefox', 'DE', '', 'Firefox', '120'),
+            ('Mozilla/5.0 Firefox', 'DE', 'Germany', ' Firefox ', '120'),
+            ('Mozilla/5.0 Chrome', 'US', 'United States', 'Chrome', '119'),
+            ('', '', '', '', ''),
+        ]
+        for user_agent, code, name, browser, version in rows:
+            OldSession.objects.create(
+                user_agent=user_agent, country_code=code, country_name=name,
+                browser_name=browser, browser_version=version,
+            )
+
+    def test_forward_dedupes_and_links(self):
+        self.create_old_sessions()
+        self.migrate(self.after)
+
+        self.assertEqual(UserAgent.objects.count(), 2)
+        self.assertEqual(Country.objects.get(code='DE').name, 'Germany')
+        self.assertEqual(Country.objects.count(), 2)
+        # ' Firefox ' is normalised onto the same row as 'Firefox'
+        self.assertEqual(list(Browser.objects.order_by('name').values_list('name', 'version')),
+                         [('Chrome', '119'), ('Firefox', '120')])
+
+        firefox = PageSession.objects.filter(browser__name='Firefox')
+        self.assertEqual(firefox.count(), 2)
+        self.assertEqual(set(firefox.values_list('user_agent__hash', flat=True)),
+                         {user_agent_hash('Mozilla/5.0 Firefox')})
+        self.assertEqual(set(firefox.values_list('country__code', flat=True)), {'DE'})
+        empty = PageSession.objects.get(user_agent__isnull=True)
+        self.assertIsNone(empty.country_id)
+        self.assertIsNone(empty.browser_id)
+
+    def test_reverse_restores_columns(self):
+        self.create_old_sessions()
+        self.migrate(self.after)
+        OldSession = self.migrate(self.before).get_model('button', 'PageSession')
+
+        restored = sorted(OldSession.objects.values_list(
+            'user_agent', 'country_code', 'country_name', 'browser_name', 'browser_version'))
+        self.assertEqual(restored, [
+            ('', '', '', '', ''),
+            ('Mozilla/5.0 Chrome', 'US', 'United States', 'Chrome', '119'),
+            ('Mozilla/5.0 Firefox', 'DE', 'Germany', 'Firefox', '120'),
+            ('Mozilla/5.0 Firefox', 'DE', 'Germany', 'Firefox', '120'),
+        ])
+
+
+@override_settings(TRUSTED_PROXIES=['127.0.0.1', '10.0.0.0/8'])
+class ClientIpTests(SimpleTestCase):
+
+    def client_ip(self, remote_addr, forwarded_for=None):
+        headers = {'HTTP_X_FORWARDED_FOR': forwarded_for} if forwarded_for else {}
+        return get_client_ip(RequestFactory().get('/', REMOTE_ADDR=remote_addr, **headers))
+
+    def test_no_forwarded_for(self):
+        self.assertEqual(self.client_ip('198.51.100.1'), '198.51.100.1')
+
+    def test_forwarded_for_ignored_from_untrusted_peer(self):
+        self.assertEqual(self.client_ip('198.51.100.1', '203.0.113.5'), '198.51.100.1')
+
+    def test_spoofed_leftmost_entry_ignored(self):
+        # The client sent its own X-Forwarded-For; the proxy appended the real address
+        self.assertEqual(self.client_ip('127.0.0.1', '6.6.6.6, 203.0.113.5'), '203.0.113.5')
+
+    def test_chain_of_trusted_proxies(self):
+        self.assertEqual(self.client_ip('127.0.0.1', '6.6.6.6, 203.0.113.5, 10.0.0.2, 10.0.0.3'), '203.0.113.5')
+
+    def test_invalid_hop_is_not_trusted(self):
+        self.assertEqual(self.client_ip('127.0.0.1', '203.0.113.5, garbage'), 'garbage')
+
+
+class TokenBucketLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('button.ratelimit.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_shed(self):
+        limiter = TokenBucketLimiter(burst=3, rate=1)
+        self.assertEqual([limiter.allow('a') for _ in range(4)], [True, True, True, False])
+        # Other keys have their own bucket
+        self.assertTrue(limiter.allow('b'))
+        self.assertEqual(limiter.stats(), {'allowed': 4, 'shed': 1, 'tracked_keys': 2})
+
+    def test_refill(self):
+        limiter = TokenBucketLimiter(burst=3, rate=0.5)
+        for _ in range(3):
+            limiter.allow('a')
+        self.assertFalse(limiter.allow('a'))
+        self.now += 2
+        self.assertTrue(limiter.allow('a'))
+        self.assertFalse(limiter.allow('a'))
+        # Never refills past the burst
+        self.now += 3600
+        self.assertEqual([limiter.allow('a') for _ in range(4)], [True, True, True, False])
+
+    def test_least_recently_seen_key_evicted(self):
+        limiter = TokenBucketLimiter(burst=1, rate=0.001, max_keys=2)
+        self.assertTrue(limiter.allow('a'))
+        self.assertFalse(limiter.allow('a'))
+        self.now += 1
+        self.assertTrue(limiter.allow('b'))
+        self.now += 1
+        self.assertTrue(limiter.allow('c'))
+        self.assertEqual(limiter.stats()['tracked_keys'], 2)
+        # 'a' was evicted, so it starts again with a full bucket
+        self.now += 1
+        self.assertTrue(limiter.allow('a'))
+        # ...while 'c' kept its empty one
+        self.assertFalse(limiter.allow('c'))
+
+    def test_retry_after(self):
+        self.assertEqual(TokenBucketLimiter(burst=1, rate=0.5).retry_after(), 2)
+        self.assertEqual(TokenBucketLimiter(burst=1, rate=4).retry_after(), 1)
+
+    def test_wedged_lock(self):
+        limiter = TokenBucketLimiter(burst=1, rate=1)
+        limiter.allow('a')
+        limiter.lock.acquire()
+        self.addCleanup(limiter.lock.release)
+        # Neither ingestion nor the stats endpoint waits on it
+        self.assertTrue(limiter.allow('a'))
+        self.assertEqual(limiter.stats(), {'allowed': 1, 'shed': 0, 'tracked_keys': 1})
+
+
+@override_settings(RATE_LIMITS={'session': (20, 0.5)})
+class GetLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        ratelimit._limiters.clear()
+        self.addCleanup(ratelimit._limiters.clear)
+
+    def test_concurrent_first_use_creates_one_limiter(self):
+        limiters = []
+        # Every thread gets past the unlocked check before any can create the limiter
+        with ratelimit._limiters_lock:
+            threads = [threading.Thread(target=lambda: limiters.append(ratelimit.get_limiter('session')))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(limiter) for limiter in limiters}), 1)
+        self.assertIs(limiters[0], ratelimit._limiters['session'])
+
+    def test_changed_limits_replace_limiter(self):
+        limiter = ratelimit.get_limiter('session')
+        self.assertIs(ratelimit.get_limiter('session'), limiter)
+        with override_settings(RATE_LIMITS={'session': (5, 1)}):
+            self.assertIsNot(ratelimit.get_limiter('session'), limiter)
+        with override_settings(RATE_LIMITS={}):
+            self.assertIsNone(ratelimit.get_limiter('session'))
+
+
+@override_settings(RATE_LIMITS={'reclick': (2, 0.5)})
+class RateLimitResponseTests(TestCase):
+
+    def setUp(self):
+        ratelimit._limiters.clear()
+        self.addCleanup(ratelimit._limiters.clear)
+
+    def reclick(self, remote_addr='198.51.100.1'):
+        return self.client.post('/api/reclick/', data=json.dumps({'session_id': None}),
+                                content_type='application/json', REMOTE_ADDR=remote_addr)
+
+    def test_over_budget_gets_429(self):
+        self.assertNotEqual(self.reclick().status_code, 429)
+        self.assertNotEqual(self.reclick().status_code, 429)
+        response = self.reclick()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(response.json(), {'status': 'error', 'message': 'Too many requests'})
+        # Other clients are unaffected
+        self.assertNotEqual(self.reclick('198.51.100.2').status_code, 429)
+        self.assertEqual(ratelimit.limiter_stats()['reclick']['shed'], 1)
+
+
+class OgImageTests(TestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.cache_path = os.path.join(workdir.name, 'og-image.png')
+        settings_override = override_settings(OG_IMAGE_CACHE_PATH=self.cache_path, OG_IMAGE_TTL=300)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache_patch = mock.patch.dict(views.OG_IMAGE_CACHE, {'png': None, 'etag': None, 'rendered_at': 0})
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+    def test_renders_png_with_etag(self):
+        response = self.client.get('/og.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+        self.assertTrue(os.path.exists(self.cache_path))
+
+    def test_matching_etag_gets_304(self):
+        etag = self.client.get('/og.png')['ETag']
+        with mock.patch('button.og_image.render_png') as render_png:
+            response = self.client.get('/og.png', HTTP_IF_NONE_MATCH=etag)
+        render_png.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get('/og.png', HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_reuses_image_rendered_by_another_worker(self):
+        etag = self.client.get('/og.png')['ETag']
+        # A fresh worker has an empty memory cache but finds the file on disk
+        views.OG_IMAGE_CACHE.update(png=None, etag=None, rendered_at=0)
+        with mock.patch('button.og_image.render_png') as render_png:
+            response = self.client.get('/og.png', HTTP_IF_NONE_MATCH=etag)
+        render_png.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+
+
+class IP2LocationLookupTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(views, IP2LOC_DATABASE=None, IP2LOC_CHECKED_AT=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('button.views.open_ip2location', return_value='database')
+    @mock.patch('button.views.get_ip2location_path', return_value=None)
+    def test_bin_installed_after_startup_is_found(self, get_path, open_database):
+        with mock.patch('button.views.time.monotonic', return_value=1000.0):
+            self.assertIsNone(views.get_ip2location_db())
+
+        get_path.return_value = '/srv/IP2LOCATION-LITE-DB1.BIN'
+        with mock.patch('button.views.time.monotonic', return_value=1000.0 + views.IP2LOC_RETRY_INTERVAL / 2):
+            self.assertIsNone(views.get_ip2location_db())
+        with mock.patch('button.views.time.monotonic', return_value=1000.0 + views.IP2LOC_RETRY_INTERVAL):
+            self.assertEqual(views.get_ip2location_db(), 'database')
+        self.assertEqual(get_path.call_count, 2)
+
+        # Once found it is kept
+        self.assertEqual(views.get_ip2location_db(), 'database')
+        open_database.assert_called_once_with('/srv/IP2LOCATION-LITE-DB1.BIN')
+
+    def test_file_io_handle_reopened_after_fork(self):
+        views.IP2LOC_DATABASE = mock.Mock(mode='FILE_IO')
+        views.IP2LOC_CHECKED_AT = 1000.0
+        views.ip2location_after_fork()
+        self.assertIsNone(views.IP2LOC_DATABASE)
+        # ...and the next lookup searches straight away rather than waiting out the retry interval
+        self.assertIsNone(views.IP2LOC_CHECKED_AT)
+
+    def test_memory_mapped_database_kept_after_fork(self):
+        database = views.IP2LOC_DATABASE = mock.Mock(mode='SHARED_MEMORY')
+        views.ip2location_after_fork()
+        self.assertIs(views.IP2LOC_DATABASE, database)
+
+
+class BackgroundFileHandlerTests(SimpleTestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.log_path = os.path.join(workdir.name, 'test.log')
+        self.logger = logging.getLogger('button.tests.background')
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, 'handlers', [])
+
+    def test_dict_config(self):
+        # The step that rejected QueueHandler subclasses on Python 3.12+
+        handler = logging.config.DictConfigurator({'version': 1}).configure_handler({
+            'class': 'button.logging_utils.BackgroundFileHandler',
+            'filename': self.log_path,
+            'level': 'INFO',
+        })
+        handler.setFormatter(logging_utils.JsonFormatter())
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.debug('below the handler level')
+        self.logger.info('kept', extra={'event': 'test'})
+        handler.close()
+
+        with open(self.log_path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([(e['message'], e['event']) for e in entries], [('kept', 'test')])
+
+    def test_full_queue_drops_records(self):
+        handler = logging_utils.BackgroundFileHandler(self.log_path)
+        self.addCleanup(handler.close)
+        self.logger.addHandler(handler)
+        # Stand in for a queue the listener can't keep up with
+        with mock.patch.object(handler, 'queue', queue.Queue(1)):
+            for _ in range(3):
+                self.logger.warning('flood')
+        self.assertEqual(handler.dropped, 2)
+
+    def test_close_with_full_queue(self):
+        handler = logging_utils.BackgroundFileHandler(self.log_path, max_queue=1)
+        self.logger.addHandler(handler)
+        for _ in range(50):
+            self.logger.warning('flood')
+        handler.close()
+        self.assertIsNone(handler.listener)
+
+    def test_closed_handler_not_restarted_after_fork(self):
+        handler = logging_utils.BackgroundFileHandler(self.log_path)
+        handler.close()
+        logging_utils._restart_listeners()
+        self.assertIsNone(handler.listener)
+
+
+class AnalyticsChangeListTests(SimpleTestCase):
+
+    def queryset_db(self, method, path='/admin/button/pagesession/'):
+        request = getattr(RequestFactory(), method.lower())(path)
+        request.resolver_match = resolve(path)
+        with mock.patch('button.admin.analytics_alias', return_value='analytics'):
+            return site._registry[PageSession].get_queryset(request).db
+
+    def test_changelist_reads_from_analytics(self):
+        self.assertEqual(self.queryset_db('GET'), 'analytics')
+        self.assertEqual(self.queryset_db('HEAD'), 'analytics')
+
+    def test_changelist_actions_use_default(self):
+        # "Delete selected" and list_editable saves POST to the changelist
+        self.assertEqual(self.queryset_db('POST'), 'default')
+
+    def test_change_form_uses_default(self):
+        self.assertEqual(self.queryset_db('GET', '/admin/button/pagesession/1/change/'), 'default')
+
+
+@override_settings(RATE_LIMITS={})
+class StatsApiTests(TestCase):
+
+    # Every key the single /api/stats/ response had before it was split into sections
+    PAYLOAD_KEYS = {
+        'total_sessions', 'total_clicks', 'clicked_sessions', 'bounce_rate', 'click_through_rate',
+        'avg_time_to_click', 'fastest_click', 'slowest_click', 'country_stats', 'recent_clicks',
+        'total_reclick_attempts', 'top_referrers', 'browser_stats', 'sessions_today', 'clicks_today',
+        'most_active_country', 'most_popular_browser',
+    }
+
+    def setUp(self):
+        cache.clear()
+        us = Country.objects.create(code='US', name='United States')
+        de = Country.objects.create(code='DE', name='Germany')
+        chrome = Browser.objects.create(name='Chrome', version='120')
+        firefox = Browser.objects.create(name='Firefox', version='121')
+        rows = [
+            (us, chrome, 1.5, 0, 'https://www.reddit.com/r/InternetIsBeautiful/'),
+            (us, chrome, 2.5, 0, 'https://news.ycombinator.com/'),
+            (de, firefox, 4.0, 2, 'https://reddit.com/'),
+            (None, chrome, None, 0, 'https://justabutton.org/'),
+            (de, None, None, 1, ''),
+        ]
+        self.sessions = []
+        now = timezone.now()
+        for i, (country, browser, time_to_click, reclicks, referrer) in enumerate(rows):
+            session = PageSession.objects.create(
+                country=country, browser=browser, clicked=time_to_click is not None,
+                time_to_click=time_to_click, reclick_attempts=reclicks, referrer=referrer,
+            )
+            self.sessions.append(session)
+            if time_to_click is not None:
+                ButtonClick.objects.create(session=session, time_elapsed=time_to_click,
+                                           clicked_at=now - timedelta(minutes=10 - i))
+
+    def test_full_payload_matches_previous_api(self):
+        response = self.client.get('/api/stats/')
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(set(payload) - {'data_as_of', 'country_stats_next_offset'}, self.PAYLOAD_KEYS)
+
+        self.assertEqual(payload['total_sessions'], 5)
+        self.assertEqual(payload['total_clicks'], 3)
+        self.assertEqual(payload['clicked_sessions'], 3)
+        self.assertEqual(payload['click_through_rate'], 60.0)
+        self.assertEqual(payload['bounce_rate'], 40.0)
+        self.assertEqual(payload['avg_time_to_click'], 2.67)
+        self.assertEqual(payload['fastest_click'], 1.5)
+        self.assertEqual(payload['slowest_click'], 4.0)
+        self.assertEqual(payload['total_reclick_attempts'], 3)
+        self.assertEqual(payload['sessions_today'], 5)
+        self.assertEqual(payload['clicks_today'], 3)
+        self.assertEqual(payload['most_active_country'], 'United States')
+        self.assertEqual(payload['most_popular_browser'], 'Chrome')
+        self.assertEqual(payload['country_stats'], [
+            {'country_name': 'United States', 'country_code': 'US', 'clicks': 2, 'avg_time': 2.0},
+            {'country_name': 'Germany', 'country_code': 'DE', 'clicks': 1, 'avg_time': 4.0},
+        ])
+        self.assertIsNone(payload['country_stats_next_offset'])
+        self.assertEqual([(c['country_code'], c['time_elapsed']) for c in payload['recent_clicks']],
+                         [('DE', 4.0), ('US', 2.5), ('US', 1.5)])
+        self.assertEqual(payload['top_referrers'], [
+            {'domain': 'reddit.com', 'visits': 2},
+            {'domain': 'news.ycombinator.com', 'visits': 1},
+        ])
+        self.assertEqual(payload['browser_stats'], [
+            {'browser_name': 'Chrome', 'count': 3},
+            {'browser_name': 'Firefox', 'count': 1},
+        ])
+
+    def test_fields_selects_sections(self):
+        payload = self.client.get('/api/stats/?fields=recent, browsers').json()
+        self.assertEqual(set(payload), {'recent_clicks', 'browser_stats', 'data_as_of'})
+
+    def test_unknown_fields_rejected(self):
+        response = self.client.get('/api/stats/?fields=summary,secrets')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secrets', response.json()['message'])
+
+        for fields in (',', '%20', ' , '):
+            with self.subTest(fields=fields):
+                response = self.client.get(f'/api/stats/?fields={fields}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Choose from', response.json()['message'])
+
+    def test_section_endpoints(self):
+        expected = {
+            'summary': 'total_clicks',
+            'countries': 'country_stats',
+            'recent': 'recent_clicks',
+            'referrers': 'top_referrers',
+            'browsers': 'browser_stats',
+        }
+        for section, key in expected.items():
+            with self.subTest(section=section):
+                response = self.client.get(f'/api/stats/{section}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(key, response.json())
+                self.assertIn('max-age=', response['Cache-Control'])
+
+    def test_country_pagination(self):
+        first = self.client.get('/api/stats/countries/?limit=1').json()
+        self.assertEqual([c['country_code'] for c in first['country_stats']], ['US'])
+        self.assertEqual(first['country_stats_next_offset'], 1)
+
+        second = self.client.get(f"/api/stats/countries/?limit=1&offset={first['country_stats_next_offset']}").json()
+        self.assertEqual([c['country_code'] for c in second['country_stats']], ['DE'])
+        self.assertIsNone(second['country_stats_next_offset'])
+
+    def test_country_limit_at_least_one(self):
+        # limit=0 would hand back next_offset == offset and loop a paginating client forever
+        payload = self.client.get('/api/stats/countries/?limit=0').json()
+        self.assertEqual(len(payload['country_stats']), 1)
+        self.assertEqual(payload['country_stats_next_offset'], 1)
+
+    def test_click_shows_up_despite_cache(self):
+        self.assertEqual(self.client.get('/api/stats/summary/').json()['total_clicks'], 3)
+        session = self.sessions[3]
+        response = self.client.post('/api/click/', data=json.dumps({'session_id': str(session.session_id),
+                                                                    'time_elapsed': 0.5}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.get('/api/stats/summary/').json()['total_clicks'], 4)
+        self.assertEqual(self.client.get('/api/stats/recent/').json()['recent_clicks'][0]['time_elapsed'], 0.5)
+
+
+class FakeIP2Location:
+    """Stands in for an IP2Location BIN with a fixed {ip: (code, name)} table"""
+
+    def __init__(self, countries):
+        self.countries = countries
+
+    def get_all(self, ip):
+        if ip not in self.countries:
+            return None
+        code, name = self.countries[ip]
+        return mock.Mock(country_short=code, country_long=name)
+
+
+class RegeolocateTests(TestCase):
+
+    COUNTRIES = {
+        '192.0.2.1': ('US', 'United States'),
+        '192.0.2.2': ('DE', 'Germany'),
+        '192.0.2.3': ('FR', 'France'),
+        '2001:db8::1': ('JP', 'Japan'),
+    }
+
+    def setUp(self):
+        _intern_country.cache_clear()
+        self.addCleanup(_intern_country.cache_clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database = os.path.join(directory.name, 'IP2LOCATION-LITE-DB1.BIN')
+        open(self.database, 'wb').close()
+        self.checkpoint = os.path.join(directory.name, 'regeolocate.json')
+        # The pool forks, so the workers see the patched opener too
+        patcher = mock.patch('button.management.commands.regeolocate.open_ip2location',
+                             return_value=FakeIP2Location(self.COUNTRIES))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_sessions(self, *rows):
+        """Sessions with ascending ids, one per (ip, country code or None)"""
+        for number, (ip, code) in enumerate(rows, 1):
+            country = Country.objects.get_or_create(code=code)[0] if code else None
+            PageSession.objects.create(session_id=uuid.UUID(int=number), ip_address=ip, country=country)
+
+    def countries(self):
+        return list(PageSession.objects.order_by('session_id').values_list('country__code', flat=True))
+
+    def regeolocate(self, **options):
+        stdout = io.StringIO()
+        options = {'database': self.database, 'checkpoint': self.checkpoint, 'workers': 2,
+                   'chunk_size': 2, 'batch_size': 1, 'pause': 0, **options}
+        call_command('regeolocate', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_fills_missing_countries(self):
+        self.create_sessions(('192.0.2.1', None), ('192.0.2.2', 'US'), ('198.51.100.1', None),
+                             ('2001:db8::1', None), ('192.0.2.3', None), (None, None))
+        output = self.regeolocate()
+        # Every chunk of the keyset walk is visited; sessions with a country are left alone
+        self.assertEqual(self.countries(), ['US', 'US', None, 'JP', 'FR', None])
+        self.assertIn('Done: 4 sessions scanned, 3 updated', output)
+        self.assertEqual(Country.objects.get(code='FR').name, 'France')
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_all_rewrites_only_changed_sessions(self):
+        self.create_sessions(('192.0.2.1', 'US'), ('192.0.2.2', 'US'), ('192.0.2.3', None),
+                             ('2001:db8::1', 'JP'), ('198.51.100.1', 'DE'))
+        output = self.regeolocate(all=True)
+        # A lookup that finds nothing keeps the old country
+        self.assertEqual(self.countries(), ['US', 'DE', 'FR', 'JP', 'DE'])
+        self.assertIn('Done: 5 sessions scanned, 2 updated', output)
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        self.create_sessions(*[(ip, None) for ip in self.COUNTRIES])
+        write = Command.write
+
+        def fail_second_chunk(command, changes, batch_size, pause):
+            if str(changes[0].session_id) == str(uuid.UUID(int=3)):
+                raise RuntimeError('interrupted')
+            return write(command, changes, batch_size, pause)
+
+        with mock.patch.object(Command, 'write', autospec=True, side_effect=fail_second_chunk):
+            with self.assertRaisesMessage(RuntimeError, 'interrupted'):
+                self.regeolocate()
+        self.assertEqual(self.countries(), ['US', 'DE', None, None])
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f), {'mode': 'missing', 'last_session_id': str(uuid.UUID(int=2))})
+
+        # Only sessions after the checkpoint are read again
+        output = self.regeolocate()
+        self.assertIn(f'Resuming after session {uuid.UUID(int=2)}', output)
+        self.assertIn('Done: 2 sessions scanned, 2 updated', output)
+        self.assertEqual(self.countries(), ['US', 'DE', 'FR', 'JP'])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_from_other_mode_rejected(self):
+        self.create_sessions(('192.0.2.1', None))
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'mode': 'all', 'last_session_id': str(uuid.UUID(int=1))}, f)
+        with self.assertRaisesMessage(CommandError, 'use --restart'):
+            self.regeolocate()
+        self.assertEqual(self.countries(), [None])
+
+        self.regeolocate(restart=True)
+        self.assertEqual(self.countries(), ['US'])
+        self.assertFalse(os.path.exists(self.checkpoint))
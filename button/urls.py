@@ -5,8 +5,15 @@ app_name = 'button'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('og.png', views.og_image, name='og_image'),
     path('api/session/', views.create_session, name='create_session'),
     path('api/click/', views.record_click, name='record_click'),
     path('api/reclick/', views.record_reclick, name='record_reclick'),
     path('api/stats/', views.get_stats, name='get_stats'),
+    path('api/stats/summary/', views.get_stats_section, {'section': 'summary'}, name='stats_summary'),
+    path('api/stats/countries/', views.get_stats_section, {'section': 'countries'}, name='stats_countries'),
+    path('api/stats/recent/', views.get_stats_section, {'section': 'recent'}, name='stats_recent'),
+    path('api/stats/referrers/', views.get_stats_section, {'section': 'referrers'}, name='stats_referrers'),
+    path('api/stats/browsers/', views.get_stats_section, {'section': 'browsers'}, name='stats_browsers'),
+    path('api/ratelimit/', views.rate_limit_stats, name='rate_limit_stats'),
 ]
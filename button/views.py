@@ -1,26 +1,62 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.db.models import Avg, Count, Q, Max, Min, Sum
+from django.db.models import Avg, Count, F, Q, Max, Min, Sum
 from urllib.parse import urlparse
-from .models import PageSession, ButtonClick
+from .models import PageSession, ButtonClick, UserAgent, Country, Browser
+from .ratelimit import rate_limit, limiter_stats
+from .routers import analytics_alias, analytics_reads, data_as_of, use_analytics_db
+from django.contrib.admin.views.decorators import staff_member_required
+import glob
+import hashlib
+import ipaddress
 import json
-import requests
+import logging
+import threading
+import time
 from datetime import timedelta
+from functools import lru_cache
 from django.utils import timezone
-import IP2Location
 import os
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def trusted_networks(proxies):
+    """Parse a TRUSTED_PROXIES tuple once rather than on every request"""
+    return tuple(ipaddress.ip_network(network, strict=False) for network in proxies)
+
+
+def is_trusted_proxy(ip):
+    """Check whether an address belongs to one of settings.TRUSTED_PROXIES"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    networks = trusted_networks(tuple(getattr(settings, 'TRUSTED_PROXIES', [])))
+    return any(address in network for network in networks)
 
 
 def get_client_ip(request):
-    """Extract client IP address from request"""
+    """Extract client IP address from request
+
+    X-Forwarded-For is only honoured when the request came from a trusted
+    proxy. The header is walked from the right and the first address that is
+    not itself a trusted proxy is the client, so a spoofed leftmost entry
+    can't pick its own rate limit bucket.
+    """
+    ip = request.META.get('REMOTE_ADDR')
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
+    if x_forwarded_for and is_trusted_proxy(ip):
+        for hop in reversed([hop.strip() for hop in x_forwarded_for.split(',') if hop.strip()]):
+            ip = hop
+            if not is_trusted_proxy(hop):
+                break
     return ip
 
 
@@ -35,8 +71,7 @@ def sanitize_referrer(referrer):
     referrer_lower = referrer.lower()
     for pattern in dangerous_patterns:
         if pattern in referrer_lower:
-            import logging
-            logging.warning(f"Blocked malicious referrer: {referrer}")
+            logger.warning("Blocked malicious referrer: %s", referrer[:200], extra={'event': 'referrer_blocked'})
             return ''
 
     # Limit length to prevent DOS
@@ -46,21 +81,70 @@ def sanitize_referrer(referrer):
     return referrer
 
 
+def get_ip2location_path():
+    """Path of the IP2Location BIN file in the project root, or None"""
+    bin_files = glob.glob(os.path.join(settings.BASE_DIR, '*.BIN'))
+    return bin_files[0] if bin_files else None  # Use the first BIN file found
+
+
+def open_ip2location(db_path):
+    """Open a BIN file memory-mapped, falling back to plain file reads
+
+    The library opens the BIN ``r+b`` and maps it read-write for
+    SHARED_MEMORY, so that mode only works when the server user can write
+    the file; lookups never write to it. A mapped database has no file
+    offset, so one handle is safe to use from many threads and from
+    processes forked after it was opened, and its pages are shared through
+    the OS page cache.
+
+    The FILE_IO fallback reads through one file object whose seek offset is
+    shared by every process that inherits it, so it must not cross fork();
+    see ip2location_after_fork().
+    """
+    import IP2Location
+
+    try:
+        return IP2Location.IP2Location(db_path, 'SHARED_MEMORY')
+    except (OSError, ValueError):
+        # mmap needs a writable file handle
+        return IP2Location.IP2Location(db_path)
+
+
 # Initialize IP2Location database
 IP2LOC_DATABASE = None
+IP2LOC_CHECKED_AT = None
+# Seconds between looks for a BIN file while none is installed
+IP2LOC_RETRY_INTERVAL = 60
 def get_ip2location_db():
-    """Get or initialize IP2Location database"""
-    global IP2LOC_DATABASE
+    """Get or initialize IP2Location database
+
+    Opened once per process (in the gunicorn master when the app is
+    preloaded) and shared by every worker and thread. Until a BIN file is
+    found the project root is checked again every IP2LOC_RETRY_INTERVAL
+    seconds, so one installed after startup is picked up without a restart.
+    """
+    global IP2LOC_DATABASE, IP2LOC_CHECKED_AT
     if IP2LOC_DATABASE is None:
-        # Look for any BIN file in the project root
-        import glob
-        bin_files = glob.glob(os.path.join(settings.BASE_DIR, '*.BIN'))
-        if bin_files:
-            db_path = bin_files[0]  # Use the first BIN file found
-            IP2LOC_DATABASE = IP2Location.IP2Location(db_path)
+        now = time.monotonic()
+        if IP2LOC_CHECKED_AT is None or now - IP2LOC_CHECKED_AT >= IP2LOC_RETRY_INTERVAL:
+            IP2LOC_CHECKED_AT = now
+            db_path = get_ip2location_path()
+            if db_path:
+                IP2LOC_DATABASE = open_ip2location(db_path)
     return IP2LOC_DATABASE
 
 
+def ip2location_after_fork():
+    """Called in a forked worker: drop an inherited FILE_IO handle so this process opens its own
+
+    Concurrent seek()+read() calls through a shared file offset would return
+    other workers' records. A memory-mapped database is kept.
+    """
+    global IP2LOC_DATABASE, IP2LOC_CHECKED_AT
+    if IP2LOC_DATABASE is not None and IP2LOC_DATABASE.mode != 'SHARED_MEMORY':
+        IP2LOC_DATABASE = IP2LOC_CHECKED_AT = None
+
+
 def get_country_from_ip(ip):
     """Get country information from IP address using local IP2Location database"""
     # Skip invalid IPs
@@ -79,11 +163,12 @@ def get_country_from_ip(ip):
                 }
     except Exception as e:
         # Log error but continue to fallback
-        import logging
-        logging.error(f"IP2Location error for IP {ip}: {e}")
+        logger.error("IP2Location error for IP %s: %s", ip, e, extra={'event': 'geoip_error'})
 
     # Fallback to ip-api.com if local database fails
     try:
+        import requests  # only needed on this slow path
+
         response = requests.get(f'http://ip-api.com/json/{ip}', timeout=2)
         if response.status_code == 200:
             data = response.json()
@@ -93,8 +178,7 @@ def get_country_from_ip(ip):
                     'country_name': data.get('country', '')
                 }
     except Exception as e:
-        import logging
-        logging.error(f"ip-api error for IP {ip}: {e}")
+        logger.error("ip-api error for IP %s: %s", ip, e, extra={'event': 'geoip_error'})
 
     return {'country_code': '', 'country_name': ''}
 
@@ -106,6 +190,7 @@ def index(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('session', get_client_ip)
 def create_session(request):
     """Create a new page session"""
     ip = get_client_ip(request)
@@ -128,32 +213,35 @@ def create_session(request):
     # Sanitize referrer to prevent injection attacks
     referrer = sanitize_referrer(referrer)
 
-    # Debug logging
-    import logging
-    logging.info(f"New session - IP: {ip}, Referrer: {referrer}, User-Agent: {user_agent[:50]}")
+    # Debug logging (sampled in production, see settings_prod.LOGGING)
+    logger.info("New session", extra={
+        'event': 'session_created',
+        'ip': ip,
+        'referrer': referrer,
+        'user_agent': user_agent[:50],
+    })
 
     # Get country info
     country_info = get_country_from_ip(ip)
 
     session = PageSession.objects.create(
         ip_address=ip,
-        user_agent=user_agent,
+        user_agent_id=UserAgent.intern(user_agent),
         referrer=referrer,
-        browser_name=browser_name,
-        browser_version=browser_version,
-        country_code=country_info['country_code'],
-        country_name=country_info['country_name']
+        browser_id=Browser.intern(browser_name, browser_version),
+        country_id=Country.intern(country_info['country_code'], country_info['country_name'])
     )
 
     return JsonResponse({
         'session_id': str(session.session_id),
-        'country_code': session.country_code,
-        'country_name': session.country_name
+        'country_code': country_info['country_code'],
+        'country_name': country_info['country_name']
     })
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('click', get_client_ip)
 def record_click(request):
     """Record a button click"""
     try:
@@ -191,6 +279,7 @@ def record_click(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('reclick', get_client_ip)
 def record_reclick(request):
     """Record a reclick attempt"""
     try:
@@ -206,64 +295,166 @@ def record_reclick(request):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 
-@require_http_methods(["GET"])
-def get_stats(request):
-    """Get aggregated statistics"""
-    total_sessions = PageSession.objects.count()
-    total_clicks = ButtonClick.objects.count()
-    clicked_sessions = PageSession.objects.filter(clicked=True).count()
+# Rendered share image, shared by every request in this worker
+OG_IMAGE_CACHE = {'png': None, 'etag': None, 'rendered_at': 0}
+OG_IMAGE_LOCK = threading.Lock()
 
-    # Calculate click-through rate
-    ctr = (clicked_sessions / total_sessions * 100) if total_sessions > 0 else 0
 
-    # Average time to click
-    avg_time = PageSession.objects.filter(clicked=True).aggregate(
-        avg=Avg('time_to_click')
-    )['avg'] or 0
+def _load_og_image_from_disk(max_age):
+    """Reuse a PNG another worker rendered recently, if there is one"""
+    path = settings.OG_IMAGE_CACHE_PATH
+    try:
+        rendered_at = os.path.getmtime(path)
+        if time.time() - rendered_at >= max_age:
+            return False
+        with open(path, 'rb') as f:
+            png = f.read()
+    except OSError:
+        return False
+    OG_IMAGE_CACHE.update(png=png, etag=f'"{hashlib.md5(png).hexdigest()}"', rendered_at=rendered_at)
+    return True
+
+
+def _render_og_image():
+    """Render the share image with the current counters and write it to both caches"""
+    from . import og_image  # NumPy/Pillow are only needed here
+
+    with analytics_reads():
+        total_clicks = ButtonClick.objects.count()
+        avg_time = PageSession.objects.filter(clicked=True).aggregate(avg=Avg('time_to_click'))['avg'] or 0
+    png = og_image.render_png(total_clicks, avg_time)
+    OG_IMAGE_CACHE.update(png=png, etag=f'"{hashlib.md5(png).hexdigest()}"', rendered_at=time.time())
+
+    path = settings.OG_IMAGE_CACHE_PATH
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error("Could not write OG image cache %s: %s", path, e)
+
+
+@require_http_methods(["GET", "HEAD"])
+def og_image(request):
+    """Open Graph share image with live counters, re-rendered at most once per OG_IMAGE_TTL"""
+    max_age = settings.OG_IMAGE_TTL
+
+    if time.time() - OG_IMAGE_CACHE['rendered_at'] >= max_age:
+        # Only one thread renders; the rest keep serving the previous image
+        if OG_IMAGE_LOCK.acquire(blocking=OG_IMAGE_CACHE['png'] is None):
+            try:
+                if time.time() - OG_IMAGE_CACHE['rendered_at'] >= max_age and not _load_og_image_from_disk(max_age):
+                    _render_og_image()
+            finally:
+                OG_IMAGE_LOCK.release()
+
+    png, etag = OG_IMAGE_CACHE['png'], OG_IMAGE_CACHE['etag']
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(png, content_type='image/png')
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+
+def summary_stats():
+    """Headline counters: everything the stat cards and personal stats need"""
+    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    clicked = Q(clicked=True)
+
+    sessions = PageSession.objects.aggregate(
+        total_sessions=Count('session_id'),
+        clicked_sessions=Count('session_id', filter=clicked),
+        avg_time=Avg('time_to_click', filter=clicked),
+        fastest=Min('time_to_click', filter=clicked),
+        slowest=Max('time_to_click', filter=clicked),
+        total_reclicks=Sum('reclick_attempts'),
+        sessions_today=Count('session_id', filter=Q(loaded_at__gte=today_start)),
+    )
+    clicks = ButtonClick.objects.aggregate(
+        total_clicks=Count('id'),
+        clicks_today=Count('id', filter=Q(clicked_at__gte=today_start)),
+    )
+
+    total_sessions = sessions['total_sessions']
+    clicked_sessions = sessions['clicked_sessions']
+    avg_time = sessions['avg_time'] or 0
+    fastest = sessions['fastest']
+    slowest = sessions['slowest']
 
-    # Fastest and slowest clicks
-    fastest = PageSession.objects.filter(clicked=True).aggregate(
-        min=Min('time_to_click')
-    )['min']
+    # Click-through rate
+    ctr = (clicked_sessions / total_sessions * 100) if total_sessions > 0 else 0
 
-    slowest = PageSession.objects.filter(clicked=True).aggregate(
-        max=Max('time_to_click')
-    )['max']
+    # Most active country and most popular browser
+    top_country = country_stats(limit=1)['country_stats']
+    top_browser = browser_stats(limit=1)['browser_stats']
 
-    # Country statistics
-    country_stats = PageSession.objects.filter(
+    return {
+        'total_sessions': total_sessions,
+        'total_clicks': clicks['total_clicks'],
+        'clicked_sessions': clicked_sessions,
+        'bounce_rate': round(100 - ctr, 2),
+        'click_through_rate': round(ctr, 2),
+        'avg_time_to_click': round(avg_time, 2) if avg_time else 0,
+        'fastest_click': round(fastest, 2) if fastest else None,
+        'slowest_click': round(slowest, 2) if slowest else None,
+        'total_reclick_attempts': sessions['total_reclicks'] or 0,
+        'sessions_today': sessions['sessions_today'],
+        'clicks_today': clicks['clicks_today'],
+        'most_active_country': top_country[0]['country_name'] if top_country else '',
+        'most_popular_browser': top_browser[0]['browser_name'] if top_browser else '',
+    }
+
+
+def country_stats(limit=None, offset=0):
+    """Clicks and average time per country, most clicks first, one page at a time"""
+    limit = settings.COUNTRY_STATS_LIMIT if limit is None else limit
+    rows = list(PageSession.objects.filter(
         clicked=True,
-        country_name__isnull=False
+        country__isnull=False
     ).exclude(
-        country_name=''
-    ).values('country_name', 'country_code').annotate(
+        country__name=''
+    ).values(
+        country_name=F('country__name'),
+        country_code=F('country__code')
+    ).annotate(
         clicks=Count('session_id'),
         avg_time=Avg('time_to_click')
-    ).order_by('-clicks')
-
-    # Recent clicks (last 10)
-    recent_clicks = ButtonClick.objects.select_related('session').order_by('-clicked_at')[:10]
-    recent_list = [{
-        'country': click.session.country_name or 'Unknown',
-        'country_code': click.session.country_code or '',
-        'time_elapsed': round(click.time_elapsed, 2),
-        'clicked_at': click.clicked_at.isoformat()
-    } for click in recent_clicks]
-
-    # Total reclick attempts
-    total_reclicks = PageSession.objects.aggregate(
-        total=Sum('reclick_attempts')
-    )['total'] or 0
-
-    # Top referring sites
-    referrer_stats = []
-    sessions_with_referrer = PageSession.objects.exclude(referrer='').exclude(referrer__isnull=True)
-
-    # Group by domain
+    ).order_by('-clicks', 'country_name')[offset:offset + limit + 1])
+
+    return {
+        'country_stats': rows[:limit],
+        'country_stats_next_offset': offset + limit if len(rows) > limit else None,
+    }
+
+
+def recent_clicks(limit=10):
+    """The latest clicks with their country"""
+    clicks = ButtonClick.objects.select_related('session__country').order_by('-clicked_at')[:limit]
+    return {
+        'recent_clicks': [{
+            'country': (click.session.country and click.session.country.name) or 'Unknown',
+            'country_code': (click.session.country and click.session.country.code) or '',
+            'time_elapsed': round(click.time_elapsed, 2),
+            'clicked_at': click.clicked_at.isoformat()
+        } for click in clicks]
+    }
+
+
+def referrer_stats(limit=10):
+    """Top referring domains, excluding the site itself"""
+    # Count each distinct referrer in the database, then fold them into domains
+    referrers = PageSession.objects.exclude(referrer='').exclude(referrer__isnull=True).values(
+        'referrer'
+    ).annotate(visits=Count('session_id')).values_list('referrer', 'visits')
+
     referrer_domains = {}
-    for session in sessions_with_referrer:
+    for referrer, visits in referrers.iterator():
         try:
-            parsed = urlparse(session.referrer)
+            parsed = urlparse(referrer)
             domain = parsed.netloc or parsed.path.split('/')[0]
             if domain:
                 # Clean up domain (remove www.)
@@ -271,59 +462,121 @@ def get_stats(request):
                 # Skip self-referrers
                 if domain == 'justabutton.org':
                     continue
-                if domain not in referrer_domains:
-                    referrer_domains[domain] = 0
-                referrer_domains[domain] += 1
-        except:
+                referrer_domains[domain] = referrer_domains.get(domain, 0) + visits
+        except ValueError:
             pass
 
-    # Sort and get top 10
-    referrer_stats = [
-        {'domain': domain, 'visits': count}
-        for domain, count in sorted(referrer_domains.items(), key=lambda x: x[1], reverse=True)[:10]
-    ]
-
-    # Browser statistics
-    browser_stats = PageSession.objects.exclude(
-        browser_name=''
-    ).values('browser_name').annotate(
-        count=Count('session_id')
-    ).order_by('-count')[:10]
-
-    # New statistics for symmetry
-    # 1. Sessions today
-    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    sessions_today = PageSession.objects.filter(loaded_at__gte=today_start).count()
+    return {
+        'top_referrers': [
+            {'domain': domain, 'visits': count}
+            for domain, count in sorted(referrer_domains.items(), key=lambda x: x[1], reverse=True)[:limit]
+        ]
+    }
+
+
+def browser_stats(limit=10):
+    """Most common browsers by number of sessions"""
+    return {
+        'browser_stats': list(PageSession.objects.filter(
+            browser__isnull=False
+        ).values(
+            browser_name=F('browser__name')
+        ).annotate(
+            count=Count('session_id')
+        ).order_by('-count', 'browser_name')[:limit])
+    }
+
+
+# Stats sections, in the order they appear in the full /api/stats/ payload
+STATS_SECTIONS = {
+    'summary': summary_stats,
+    'countries': country_stats,
+    'recent': recent_clicks,
+    'referrers': referrer_stats,
+    'browsers': browser_stats,
+}
+
+
+# Sections a click changes. Their cache keys include the latest click id, so
+# every worker's cached copy goes stale as soon as a click is recorded.
+CLICK_SECTIONS = {'summary', 'countries', 'recent'}
+
+
+def latest_click_id():
+    return ButtonClick.objects.order_by('-id').values_list('id', flat=True).first()
+
+
+def cached_section(name, **params):
+    """Compute a stats section, caching it for settings.STATS_CACHE_TTLS[name] seconds"""
+    key = 'stats:' + name + ''.join(f':{k}={v}' for k, v in sorted(params.items()))
+    if name in CLICK_SECTIONS:
+        key += f':click={latest_click_id()}'
+    section = cache.get(key)
+    if section is None:
+        section = STATS_SECTIONS[name](**params)
+        section['data_as_of'] = data_as_of(analytics_alias()).isoformat()
+        cache.set(key, section, settings.STATS_CACHE_TTLS.get(name, 0))
+    return section
+
+
+def stats_response(sections, max_age):
+    """Merge sections into one JSON response, reporting the oldest data_as_of"""
+    payload = {}
+    as_of = []
+    for section in sections:
+        section = dict(section)
+        as_of.append(section.pop('data_as_of'))
+        payload.update(section)
+    payload['data_as_of'] = min(as_of)
+    response = JsonResponse(payload)
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def _int_param(request, name, default, minimum, maximum):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        value = default
+    return max(minimum, min(value, maximum))
 
-    # 2. Clicks today
-    clicks_today = ButtonClick.objects.filter(clicked_at__gte=today_start).count()
 
-    # 3. Most active country (country with most clicks)
-    most_active_country = ''
-    if country_stats:
-        most_active_country = country_stats[0]['country_name']
+@require_http_methods(["GET"])
+@use_analytics_db
+def get_stats(request):
+    """Get aggregated statistics
 
-    # 4. Most popular browser
-    most_popular_browser = ''
-    if browser_stats:
-        most_popular_browser = browser_stats[0]['browser_name']
+    Returns every section by default; ``?fields=summary,recent`` limits the
+    response to the named sections.
+    """
+    names = list(STATS_SECTIONS)
+    if request.GET.get('fields'):
+        names = [name.strip() for name in request.GET['fields'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in STATS_SECTIONS]
+        if unknown or not names:
+            return JsonResponse({
+                'status': 'error',
+                'message': f"Unknown fields: {', '.join(unknown) or 'none given'}. Choose from {', '.join(STATS_SECTIONS)}"
+            }, status=400)
 
-    return JsonResponse({
-        'total_sessions': total_sessions,
-        'total_clicks': total_clicks,
-        'clicked_sessions': clicked_sessions,
-        'bounce_rate': round(100 - ctr, 2),
-        'click_through_rate': round(ctr, 2),
-        'avg_time_to_click': round(avg_time, 2) if avg_time else 0,
-        'fastest_click': round(fastest, 2) if fastest else None,
-        'slowest_click': round(slowest, 2) if slowest else None,
-        'country_stats': list(country_stats),
-        'recent_clicks': recent_list,
-        'total_reclick_attempts': total_reclicks,
-        'top_referrers': referrer_stats,
-        'browser_stats': list(browser_stats),
-        'sessions_today': sessions_today,
-        'clicks_today': clicks_today,
-        'most_active_country': most_active_country,
-        'most_popular_browser': most_popular_browser
-    })
+    max_age = min(settings.STATS_CACHE_TTLS.get(name, 0) for name in names)
+    return stats_response([cached_section(name) for name in names], max_age)
+
+
+@require_http_methods(["GET"])
+@use_analytics_db
+def get_stats_section(request, section):
+    """Get a single stats section (/api/stats/<section>/)"""
+    params = {}
+    if section == 'countries':
+        # limit=0 would return the same offset as next_offset forever
+        params['limit'] = _int_param(request, 'limit', settings.COUNTRY_STATS_LIMIT, 1, settings.COUNTRY_STATS_MAX_LIMIT)
+        params['offset'] = _int_param(request, 'offset', 0, 0, 10000)
+    return stats_response([cached_section(section, **params)], settings.STATS_CACHE_TTLS.get(section, 0))
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def rate_limit_stats(request):
+    """Allowed/shed request counters, totalled over all workers when the app is preloaded"""
+    return JsonResponse(limiter_stats())
@@ -0,0 +1,73 @@
+"""Process warm-up for app servers
+
+Called from gunicorn.conf.py. With preload_app the work runs once in the
+master and every forked worker inherits the result (imported modules, the
+memory-mapped GeoIP database, compiled templates, interned dimension ids,
+and the shared rate-limit buckets).
+"""
+
+import importlib
+import logging
+import time
+
+from django.db import connections
+from django.db.models import Count
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# Modules that are imported lazily on slow paths; loading them here keeps
+# that cost out of the first request each worker serves.
+LAZY_MODULES = ['requests', 'IP2Location', 'button.og_image']
+
+# How many of the most common dimension rows to pre-intern
+PRIME_USER_AGENTS = 500
+PRIME_BROWSERS = 200
+
+
+def prime_dimension_caches():
+    """Fill the create_session intern caches with the most common values"""
+    from .models import Browser, Country, UserAgent, _intern_browser, _intern_country, _intern_user_agent
+
+    for code, name in Country.objects.values_list('code', 'name'):
+        _intern_country(code, name)
+    browsers = Browser.objects.annotate(n=Count('sessions')).order_by('-n')[:PRIME_BROWSERS]
+    for name, version in browsers.values_list('name', 'version'):
+        _intern_browser(name, version)
+    user_agents = UserAgent.objects.annotate(n=Count('sessions')).order_by('-n')[:PRIME_USER_AGENTS]
+    for value in user_agents.values_list('value', flat=True):
+        _intern_user_agent(value)
+
+
+def warm_up():
+    """Load everything the first request would otherwise pay for, then drop DB connections"""
+    started = time.perf_counter()
+
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Warm-up could not import %s: %s", name, e)
+
+    from .views import get_ip2location_db
+    get_ip2location_db()
+
+    from .ratelimit import create_limiters
+    create_limiters()
+
+    get_resolver().url_patterns
+    get_template('button/index.html')
+
+    try:
+        prime_dimension_caches()
+    except Exception as e:
+        # A missing table (e.g. before migrate) shouldn't stop the server starting
+        logger.warning("Warm-up could not prime caches: %s", e)
+    finally:
+        # Connections must not be shared across fork()
+        connections.close_all()
+
+    elapsed = time.perf_counter() - started
+    logger.info("Warm-up finished in %.1f ms", elapsed * 1000)
+    return elapsed
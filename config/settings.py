@@ -80,6 +80,15 @@ DATABASES = {
     }
 }
 
+# Optional read-only analytics database (see button/routers.py)
+# Add an 'analytics' alias to DATABASES to serve stats and reporting from it.
+# For SQLite it's a snapshot at ANALYTICS_SNAPSHOT_PATH refreshed by
+# `manage.py refresh_analytics_snapshot --loop`; it can also be a Postgres replica.
+
+DATABASE_ROUTERS = ['button.routers.AnalyticsRouter']
+ANALYTICS_SNAPSHOT_PATH = BASE_DIR / 'analytics.sqlite3'
+ANALYTICS_SNAPSHOT_INTERVAL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,6 +126,43 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Ingestion endpoint rate limits
+# Per-IP token buckets as (burst, tokens per second); drop a scope to disable it
+
+RATE_LIMITS = {
+    'session': (20, 0.5),
+    'click': (20, 0.5),
+    'reclick': (60, 2),
+}
+
+# Buckets kept per scope before the least recently seen IP is evicted. With
+# gunicorn's preload_app the workers share one set of buckets (see button/ratelimit.py).
+RATE_LIMIT_MAX_KEYS = 10000
+
+# Proxies allowed to set X-Forwarded-For (addresses or CIDR ranges)
+TRUSTED_PROXIES = ['127.0.0.1', '::1']
+
+# Stats API
+# Seconds each /api/stats/ section is cached for, and the page size of the
+# per-country list
+
+STATS_CACHE_TTLS = {
+    'summary': 2,
+    'countries': 60,
+    'recent': 5,
+    'referrers': 300,
+    'browsers': 300,
+}
+COUNTRY_STATS_LIMIT = 50
+COUNTRY_STATS_MAX_LIMIT = 250
+
+# Open Graph share image
+# Rendered with live counters at most once per OG_IMAGE_TTL seconds and shared
+# between workers through OG_IMAGE_CACHE_PATH
+
+OG_IMAGE_TTL = 300
+OG_IMAGE_CACHE_PATH = BASE_DIR / 'cache' / 'og-image.png'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -29,15 +29,46 @@ DATABASES = {
     }
 }
 
+# Serve get_stats, admin changelists and the OG image counters from a read-only
+# snapshot so they never contend with the click endpoints' writes. Run
+# `python manage.py refresh_analytics_snapshot --loop` alongside gunicorn.
+if os.environ.get('ANALYTICS_SNAPSHOT'):
+    DATABASES['analytics'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{ANALYTICS_SNAPSHOT_PATH}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+
 # Logging configuration
+# Records are written as JSON lines by a background thread (see
+# button/logging_utils.py) so requests never wait on the log file. The
+# per-session line is sampled and blocked-referrer warnings are capped.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'button.logging_utils.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sample': {
+            '()': 'button.logging_utils.SamplingFilter',
+            'rates': {'session_created': 0.1},
+        },
+        'throttle': {
+            '()': 'button.logging_utils.RateLimitFilter',
+            'limits': {'referrer_blocked': 10, 'geoip_error': 30},
+            'interval': 60,
+        },
+    },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'button.logging_utils.BackgroundFileHandler',
             'filename': '/var/log/justabutton/django.log',
+            'formatter': 'json',
+            'filters': ['sample', 'throttle'],
         },
     },
     'loggers': {
@@ -46,5 +77,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'button': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
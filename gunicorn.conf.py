@@ -0,0 +1,51 @@
+"""Gunicorn configuration for JustAButton
+
+Picked up automatically when gunicorn is started from the project root:
+
+    DJANGO_SETTINGS_MODULE=config.settings_prod gunicorn
+
+Every setting can be overridden on the command line or through the
+GUNICORN_* environment variables below.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = 'config.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Load Django once in the master so workers fork with imports, templates and
+# the GeoIP database already in (copy-on-write shared) memory.
+preload_app = True
+
+# Recycle workers periodically; the jitter stops them all restarting at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+
+def when_ready(server):
+    """Runs in the master after the app is preloaded, before any worker forks"""
+    if server.cfg.preload_app:
+        from button.warmup import warm_up
+        server.log.info("Warm-up took %.1f ms", warm_up() * 1000)
+
+
+def post_fork(server, worker):
+    """Never reuse a database connection or GeoIP file handle inherited from the master"""
+    if server.cfg.preload_app:
+        from django.db import connections
+        connections.close_all()
+
+        from button.views import ip2location_after_fork
+        ip2location_after_fork()
+
+
+def post_worker_init(worker):
+    """Without preload each worker warms itself up before accepting traffic"""
+    if not worker.cfg.preload_app:
+        from button.warmup import warm_up
+        worker.log.info("Worker %s warm-up took %.1f ms", worker.pid, warm_up() * 1000)